@@ -1,11 +1,21 @@
+import os
+
+from contextlib import asynccontextmanager
+
 from fastapi import APIRouter, FastAPI, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from bytepit_api.database import async_db, db
+from bytepit_api.database.migrations import apply_migrations
+from bytepit_api.helpers import email_helpers, judge_helpers
 from bytepit_api.routers.admin import router as admin_router
 from bytepit_api.routers.auth import router as auth_router
+from bytepit_api.routers.media import router as media_router
 from bytepit_api.routers.problem import router as problem_router
 from bytepit_api.routers.competition import router as competition_router
+from bytepit_api.services import problem_service
+from bytepit_api.storage import storage
 
 from pydantic import ValidationError
 
@@ -14,9 +24,26 @@ router = APIRouter(prefix="/api")
 router.include_router(admin_router)
 router.include_router(auth_router)
 router.include_router(competition_router)
+router.include_router(media_router)
 router.include_router(problem_router)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    apply_migrations()
+    await async_db.open()
+    judge_helpers.start_judge_workers(problem_service.judge_submission, int(os.environ.get("JUDGE_WORKERS", 4)))
+    problem_service.requeue_pending_submissions()
+    email_helpers.start_email_sender()
+    yield
+    email_helpers.stop_email_sender()
+    judge_helpers.stop_judge_workers()
+    await storage.close()
+    await async_db.close()
+    db.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
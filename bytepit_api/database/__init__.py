@@ -1,13 +1,19 @@
 import os
 
-from azure.storage.blob import BlobServiceClient
+from bytepit_api.database.database import AsyncDatabase, Database
 
-from bytepit_api.database.database import Database
-
-db = Database(os.environ["DB_CONNECTION_STRING"])
-
-blob_service_client = BlobServiceClient.from_connection_string(
-    os.environ.get("BLOB_STORAGE_CONNECTION_STRING"),
+db = Database(
+    os.environ["DB_CONNECTION_STRING"],
+    min_size=int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+    max_size=int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+    timeout=float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    max_waiting=int(os.environ.get("DB_POOL_MAX_WAITING", 0)),
 )
 
-blob_storage_container = os.environ.get("BLOB_STORAGE_CONTAINER_NAME")
+async_db = AsyncDatabase(
+    os.environ["DB_CONNECTION_STRING"],
+    min_size=int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+    max_size=int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+    timeout=float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    max_waiting=int(os.environ.get("DB_POOL_MAX_WAITING", 0)),
+)
@@ -1,13 +1,14 @@
 import uuid
 
 from bytepit_api.database import db
+from bytepit_api.database.auth_queries import USER_COLUMNS
 from bytepit_api.models.dtos import UserDTO
 from bytepit_api.models.db_models import User
 from bytepit_api.models.enums import RegisterRole
 
 
 def get_users():
-    query_tuple = ("SELECT * FROM users", ())
+    query_tuple = (f"SELECT {USER_COLUMNS} FROM users", ())
     result = db.execute_one(query_tuple)
     if result["result"]:
         return [User(**user) for user in result["result"]]
@@ -15,7 +16,7 @@ def get_users():
 
 
 def get_user_by_id(user_id: uuid.UUID):
-    query_tuple = ("SELECT * FROM users WHERE id = %s", (user_id,))
+    query_tuple = (f"SELECT {USER_COLUMNS} FROM users WHERE id = %s", (user_id,))
     result = db.execute_one(query_tuple)
 
     if result["result"]:
@@ -25,7 +26,10 @@ def get_user_by_id(user_id: uuid.UUID):
 
 
 def get_unapproved_organisers():
-    query_tuple = ("SELECT * FROM users WHERE role = 'organiser' AND approved_by_admin = false", ())
+    query_tuple = (
+        f"SELECT {USER_COLUMNS} FROM users WHERE role = 'organiser' AND approved_by_admin = false",
+        (),
+    )
     result = db.execute_one(query_tuple)
     if result["result"]:
         return [User(**user) for user in result["result"]]
@@ -33,7 +37,10 @@ def get_unapproved_organisers():
 
 
 def set_approved_organiser(username: str):
-    query_tuple = ("UPDATE users SET approved_by_admin = true WHERE username = %s", (username,))
+    query_tuple = (
+        "UPDATE users SET approved_by_admin = true, token_epoch = token_epoch + 1 WHERE username = %s",
+        (username,),
+    )
     result = db.execute_one(query_tuple)
     return result["affected_rows"] == 1
 
@@ -41,7 +48,7 @@ def set_approved_organiser(username: str):
 def set_user_role(username: str, new_role: RegisterRole):
     approved_by_admin = False if new_role == RegisterRole.organiser else True
     query_tuple = (
-        "UPDATE users SET role = %s, approved_by_admin = %s WHERE username = %s",
+        "UPDATE users SET role = %s, approved_by_admin = %s, token_epoch = token_epoch + 1 WHERE username = %s",
         (new_role, approved_by_admin, username),
     )
     result = db.execute_one(query_tuple)
@@ -1,11 +1,20 @@
 import uuid
-from bytepit_api.database import db
+
+from typing import List, Union
+from bytepit_api.database import async_db, db, email_queries
+from bytepit_api.helpers import media_helpers, upload_helpers
 from bytepit_api.models.db_models import User
 from bytepit_api.models.enums import RegisterRole
 
 
+USER_COLUMNS = """
+    users.id, users.password_hash, users.username, users.email, users.role, users.name, users.surname,
+    users.is_verified, users.approved_by_admin, users.image_sha, users.token_epoch
+"""
+
+
 def get_user_by_email(email: str):
-    query_tuple = ("SELECT * FROM users WHERE email = %s", (email,))
+    query_tuple = (f"SELECT {USER_COLUMNS} FROM users WHERE email = %s", (email,))
     result = db.execute_one(query_tuple)
     if result["result"]:
         return User(**result["result"][0])
@@ -14,7 +23,7 @@ def get_user_by_email(email: str):
 
 
 def get_user_by_username(username: str):
-    query_tuple = ("SELECT * FROM users WHERE username = %s", (username,))
+    query_tuple = (f"SELECT {USER_COLUMNS} FROM users WHERE username = %s", (username,))
     result = db.execute_one(query_tuple)
     if result["result"]:
         return User(**result["result"][0])
@@ -31,34 +40,57 @@ def create_user(
     role: RegisterRole,
     confirmation_token: str,
     image=None,
+    verification_email: Union[dict, None] = None,
 ):
     approved_by_admin = False if role == "organiser" else True
-    image_binary = image.file.read() if image else None
+    content = upload_helpers.read_upload(image) if image else None
+    image_sha, media_insert_query = media_helpers.get_insert_media_query(content) if content else (None, None)
     user_insert_query = (
         """
-        INSERT INTO users (username, password_hash, name, surname, email, role, image, is_verified, approved_by_admin)
+        INSERT INTO users
+        (username, password_hash, name, surname, email, role, image_sha, is_verified, approved_by_admin)
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
         """,
-        (username, password_hash, name, surname, email, role, image_binary, False, approved_by_admin),
+        (username, password_hash, name, surname, email, role, image_sha, False, approved_by_admin),
     )
     token_insert_query = (
         "INSERT INTO verification_tokens (token, email) " "VALUES (%s, %s)",
         (confirmation_token, email),
     )
-    result = db.execute_many([user_insert_query, token_insert_query])
-    return result["affected_rows"] == 2
+    queries = [user_insert_query, token_insert_query]
+    if verification_email is not None:
+        queries.append(email_queries.get_insert_outbound_email_query(**verification_email))
+    expected_rows = len(queries)
+    if media_insert_query is not None:
+        queries.insert(0, media_insert_query)
+    result = db.execute_many(queries)
+    return result["affected_rows"] >= expected_rows
 
 
 def set_verified_user(user_id: uuid.UUID):
-    query_tuple = ("UPDATE users SET is_verified = TRUE WHERE id = %s", (user_id,))
+    query_tuple = ("UPDATE users SET is_verified = TRUE, token_epoch = token_epoch + 1 WHERE id = %s", (user_id,))
+    result = db.execute_one(query_tuple)
+    return result["affected_rows"] == 1
+
+
+def update_password_hash(user_id: uuid.UUID, password_hash: str):
+    query_tuple = ("UPDATE users SET password_hash = %s WHERE id = %s", (password_hash, user_id))
     result = db.execute_one(query_tuple)
     return result["affected_rows"] == 1
 
 
+def get_token_epoch(user_id: uuid.UUID):
+    query_tuple = ("SELECT username, token_epoch FROM users WHERE id = %s", (user_id,))
+    result = db.execute_one(query_tuple)
+    if result.get("result"):
+        return result["result"][0]
+    return None
+
+
 def get_user_by_verification_token(verification_token: str):
     query_tuple = (
-        """
-        SELECT * FROM verification_tokens
+        f"""
+        SELECT {USER_COLUMNS} FROM verification_tokens
         JOIN users
         ON verification_tokens.email = users.email
         WHERE token = %s AND expiry_date > NOW()
@@ -72,10 +104,16 @@ def get_user_by_verification_token(verification_token: str):
         return None
 
 
-def get_user_by_id(id: uuid.UUID):
-    query_tuple = ("SELECT * FROM users WHERE id = %s", (id,))
-    result = db.execute_one(query_tuple)
+async def get_user_by_id(id: uuid.UUID):
+    query_tuple = (f"SELECT {USER_COLUMNS} FROM users WHERE id = %s", (id,))
+    result = await async_db.execute_one(query_tuple)
     if result["result"]:
         return User(**result["result"][0])
     else:
         return None
+
+
+async def get_usernames_by_ids(ids: List[uuid.UUID]):
+    query_tuple = ("SELECT id, username FROM users WHERE id = ANY(%s)", (ids,))
+    result = await async_db.execute_one(query_tuple)
+    return {user["id"]: user["username"] for user in result.get("result", [])}
@@ -1,30 +1,55 @@
 from datetime import datetime
 import uuid
-from typing import List, Union
-from bytepit_api.database import db
-from bytepit_api.models.db_models import Competition, Trophy
+from typing import List, Tuple, Union
+from bytepit_api.database import async_db
+from bytepit_api.helpers import media_helpers, upload_helpers
+from bytepit_api.models.db_models import Competition, JudgingPolicy, Problem, Trophy
 from bytepit_api.models.dtos import ProblemDTO
 
 
-def get_competitions(user_id: uuid.UUID):
+TROPHY_COLUMNS = "id, competition_id, position, user_id, icon_sha"
+
+
+async def get_competitions(user_id: uuid.UUID):
     query_tuple = ("""SELECT * FROM competitions WHERE parent_id IS NULL OR organiser_id = %s""", (user_id,))
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     if result["result"]:
         return [Competition(**competition) for competition in result["result"]]
     else:
         return []
 
 
-def get_trophies_by_competition(competition_id: uuid.UUID):
-    query_tuple = ("""SELECT * FROM trophies WHERE competition_id = %s""", (competition_id,))
-    result = db.execute_one(query_tuple)
-    if result["result"]:
-        return [Trophy(**trophy) for trophy in result["result"]]
-    else:
-        return []
+async def get_trophies_by_competitions(competition_ids: List[uuid.UUID]):
+    query_tuple = (
+        f"SELECT {TROPHY_COLUMNS} FROM trophies WHERE competition_id = ANY(%s)",
+        (competition_ids,),
+    )
+    result = await async_db.execute_one(query_tuple)
+    trophies_by_competition = {competition_id: [] for competition_id in competition_ids}
+    for trophy in result.get("result", []):
+        trophies_by_competition[trophy["competition_id"]].append(Trophy(**trophy))
+    return trophies_by_competition
 
 
-def insert_competition(
+async def get_problems_by_competitions(competition_ids: List[uuid.UUID]):
+    query_tuple = (
+        """
+        SELECT competitions.id AS competition_id, problems.*
+        FROM competitions
+        JOIN problems
+        ON problems.id = ANY(competitions.problems)
+        WHERE competitions.id = ANY(%s)
+        """,
+        (competition_ids,),
+    )
+    result = await async_db.execute_one(query_tuple)
+    problems_by_competition = {competition_id: [] for competition_id in competition_ids}
+    for problem in result.get("result", []):
+        problems_by_competition[problem["competition_id"]].append(Problem(**problem))
+    return problems_by_competition
+
+
+async def insert_competition(
     name: str,
     description: str,
     start_time: datetime,
@@ -32,87 +57,89 @@ def insert_competition(
     problems: List[uuid.UUID],
     organiser_id: uuid.UUID,
     parent_id: Union[uuid.UUID, None] = None,
+    judging_policy: JudgingPolicy = JudgingPolicy.full,
 ):
     problems_array = "{" + ",".join(map(str, problems)) + "}" if problems else None
     competition_insert_query = (
         """
-        INSERT INTO competitions (name, description, start_time, end_time, parent_id, organiser_id, problems)
-        VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id
+        INSERT INTO competitions (name, description, start_time, end_time, parent_id, organiser_id, problems, judging_policy)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id
         """,
-        (name, description, start_time, end_time, parent_id, organiser_id, problems_array),
+        (name, description, start_time, end_time, parent_id, organiser_id, problems_array, judging_policy),
     )
-    result = db.execute_one(competition_insert_query)
+    result = await async_db.execute_one(competition_insert_query)
     if result["affected_rows"] == 1:
         return result["result"][0]["id"]
     else:
         return None
 
 
-def insert_trophy(competition_id: uuid.UUID, position: int, icon):
-    icon_binary = icon.file.read() if icon else None
+async def insert_trophy(competition_id: uuid.UUID, position: int, icon):
     if not icon:
         return False
+    icon_sha = await media_helpers.store_media_async(await upload_helpers.read_upload_async(icon))
     trophy_insert_query = (
         """
-        INSERT INTO trophies (competition_id, position, icon)
+        INSERT INTO trophies (competition_id, position, icon_sha)
         VALUES (%s, %s, %s)
         """,
-        (competition_id, position, icon_binary),
+        (competition_id, position, icon_sha),
     )
-    result = db.execute_one(trophy_insert_query)
+    result = await async_db.execute_one(trophy_insert_query)
     return result["affected_rows"] == 1
 
 
-def get_problems(problem_ids: List[uuid.UUID]):
+async def get_problems(problem_ids: List[uuid.UUID]):
     query_tuple = (f"SELECT * FROM problems WHERE id IN ({', '.join(['%s']*len(problem_ids))});", tuple(problem_ids))
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     if result["result"]:
         return [ProblemDTO(**problem) for problem in result["result"]]
     else:
         return []
 
 
-def get_random_competition():
+async def get_random_competition():
     query_tuple = (
         """SELECT * FROM competitions WHERE parent_id IS NULL ORDER BY RANDOM() LIMIT 1""",
         (),
     )
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     if result["result"]:
         return Competition(**result["result"][0])
     else:
         return None
 
 
-def get_competition(competition_id: uuid.UUID):
+async def get_competition(competition_id: uuid.UUID):
     query_tuple = (
         """SELECT * FROM competitions WHERE id = %s""",
         (competition_id,),
     )
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     if result["result"]:
         return Competition(**result["result"][0])
     else:
         return None
 
 
-def get_virtual_competition(competition_id: uuid.UUID):
+async def get_virtual_competition(competition_id: uuid.UUID):
     query_tuple = (
         """SELECT * FROM competitions WHERE id = %s AND parent_id IS NOT NULL""",
         (competition_id,),
     )
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     if result["result"]:
         return Competition(**result["result"][0])
     else:
         return None
 
 
-def modify_competition(competition_id: uuid.UUID, competition: Competition):
+async def modify_competition(competition_id: uuid.UUID, competition: Competition):
     query_tuple = (
         """
         UPDATE competitions
-        SET name = %s, description = %s, start_time = %s, end_time = %s, parent_id = %s, organiser_id = %s, problems = %s
+        SET name = %s, description = %s, start_time = %s, end_time = %s, parent_id = %s, organiser_id = %s, problems = %s,
+            judging_policy = %s
         WHERE id = %s
         """,
         (
@@ -123,104 +150,178 @@ def modify_competition(competition_id: uuid.UUID, competition: Competition):
             competition.parent_id,
             competition.organiser_id,
             competition.problems,
+            competition.judging_policy,
             competition_id,
         ),
     )
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     return result["affected_rows"] == 1
 
 
-def delete_competition(competition_id: uuid.UUID):
+async def delete_competition(competition_id: uuid.UUID):
     query_tuple = ("DELETE FROM competitions WHERE id = %s", (competition_id,))
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     return result["affected_rows"] == 1
 
 
-def delete_trophy_by_competition_id(competition_id: uuid.UUID):
+async def delete_trophy_by_competition_id(competition_id: uuid.UUID):
     query_tuple = ("DELETE FROM trophies WHERE competition_id = %s", (competition_id,))
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     return result["affected_rows"] > 0
 
 
-def get_competition_results(competition_id: uuid.UUID):
+def group_results_by_user(rows: List[dict]):
+    results_by_user = {}
+    for row in rows:
+        if row["standing_user_id"] not in results_by_user:
+            results_by_user[row["standing_user_id"]] = {
+                "user_id": row["standing_user_id"],
+                "username": row["username"],
+                "total_points": row["total_points"],
+                "total_runtime": row["total_runtime"],
+                "problem_results": [],
+                "rank_in_competition": row["rank_in_competition"],
+            }
+        if row["id"] is None:
+            continue
+        results_by_user[row["standing_user_id"]]["problem_results"].append(
+            {
+                "id": row["id"],
+                "problem_id": row["problem_id"],
+                "user_id": row["user_id"],
+                "competition_id": row["competition_id"],
+                "num_of_points": row["num_of_points"],
+                "max_num_of_points": row["max_num_of_points"],
+                "source_code": row["source_code"],
+                "language": row["language"],
+                "average_runtime": row["average_runtime"],
+                "is_correct": row["is_correct"],
+            }
+        )
+    return list(results_by_user.values())
+
+
+async def get_competition_results(
+    competition_id: uuid.UUID,
+    limit: Union[int, None] = None,
+    offset: int = 0,
+    after: Union[Tuple[int, float, uuid.UUID], None] = None,
+    user_id: Union[uuid.UUID, None] = None,
+):
+    after_rank, after_runtime, after_user_id = after or (None, None, None)
     query_tuple = (
         """
+        WITH page AS (
+            SELECT *
+            FROM competition_standings
+            WHERE competition_id = %(competition_id)s
+            AND (
+                %(after_rank)s::integer IS NULL
+                OR (rank_in_competition, total_runtime, user_id)
+                > (%(after_rank)s::integer, %(after_runtime)s::double precision, %(after_user_id)s::uuid)
+            )
+            AND (%(user_id)s::uuid IS NULL OR user_id = %(user_id)s::uuid)
+            ORDER BY rank_in_competition, total_runtime, user_id
+            LIMIT %(limit)s OFFSET %(offset)s
+        )
         SELECT
-            problems.name,
+            page.user_id AS standing_user_id,
+            users.username,
+            page.total_points,
+            page.total_runtime,
+            page.rank_in_competition,
             problems.num_of_points AS max_num_of_points,
-            problems.created_on AS created_on,
             problem_results.*
-        FROM problem_results
+        FROM page
+        JOIN users
+        ON users.id = page.user_id
+        JOIN problem_results
+        ON problem_results.competition_id = page.competition_id
+        AND problem_results.user_id = page.user_id
         JOIN problems
         ON problems.id = problem_results.problem_id
-        WHERE competition_id = %s;  
+        ORDER BY page.rank_in_competition, page.total_runtime, page.user_id, problems.created_on;
         """,
-        (competition_id,),
+        {
+            "competition_id": competition_id,
+            "limit": limit,
+            "offset": offset,
+            "after_rank": after_rank,
+            "after_runtime": after_runtime,
+            "after_user_id": after_user_id,
+            "user_id": user_id,
+        },
     )
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     if result["result"]:
-        problems_by_user = {}
-        for problem in result["result"]:
-            if problem["user_id"] not in problems_by_user:
-                problems_by_user[problem["user_id"]] = {
-                    "user_id": problem["user_id"],
-                    "total_points": 0,
-                    "problem_results": [],
-                    "rank_in_competition": -1,
-                }
-            problems_by_user[problem["user_id"]]["problem_results"].append(
-                {
-                    "id": problem["id"],
-                    "problem_id": problem["problem_id"],
-                    "user_id": problem["user_id"],
-                    "competition_id": problem["competition_id"],
-                    "num_of_points": problem["num_of_points"],
-                    "max_num_of_points": problem["max_num_of_points"],
-                    "created_on": problem["created_on"],
-                    "source_code": problem["source_code"],
-                    "language": problem["language"],
-                    "average_runtime": problem["average_runtime"],
-                    "is_correct": problem["is_correct"],
-                }
-            )
-            problems_by_user[problem["user_id"]]["total_points"] += problem["num_of_points"]
-
-        sorted_problems_by_user = sorted(problems_by_user.values(), key=lambda x: x["total_points"], reverse=True)
-
-        for user_data in sorted_problems_by_user:
-            user_data["problem_results"] = sorted(user_data["problem_results"], key=lambda x: x["created_on"])
-            for problem_result in user_data["problem_results"]:
-                del problem_result["created_on"]
-
-        for i in range(len(sorted_problems_by_user)):
-            if i == 0:
-                sorted_problems_by_user[i]["rank_in_competition"] = 1
-            elif sorted_problems_by_user[i - 1]["total_points"] == sorted_problems_by_user[i]["total_points"]:
-                sorted_problems_by_user[i]["rank_in_competition"] = sorted_problems_by_user[i - 1][
-                    "rank_in_competition"
-                ]
-            else:
-                sorted_problems_by_user[i]["rank_in_competition"] = (
-                    sorted_problems_by_user[i - 1]["rank_in_competition"] + 1
-                )
-        return sorted_problems_by_user
+        return group_results_by_user(result["result"])
+    else:
+        return []
+
+
+async def get_virtual_competition_results(competition_id: uuid.UUID, parent_id: uuid.UUID, user_id: uuid.UUID):
+    query_tuple = (
+        """
+        WITH standings AS (
+            SELECT competition_id, user_id, total_points, total_runtime
+            FROM competition_standings
+            WHERE competition_id = %(parent_id)s AND user_id <> %(user_id)s
+            UNION ALL
+            SELECT
+                %(competition_id)s::uuid,
+                users.id,
+                COALESCE(competition_standings.total_points, 0),
+                COALESCE(competition_standings.total_runtime, 0)
+            FROM users
+            LEFT JOIN competition_standings
+            ON competition_standings.user_id = users.id
+            AND competition_standings.competition_id = %(competition_id)s
+            WHERE users.id = %(user_id)s
+        ),
+        ranked AS (
+            SELECT *, DENSE_RANK() OVER (ORDER BY total_points DESC) AS rank_in_competition
+            FROM standings
+        )
+        SELECT
+            ranked.user_id AS standing_user_id,
+            users.username,
+            ranked.total_points,
+            ranked.total_runtime,
+            ranked.rank_in_competition,
+            problems.num_of_points AS max_num_of_points,
+            problem_results.*
+        FROM ranked
+        JOIN users
+        ON users.id = ranked.user_id
+        LEFT JOIN problem_results
+        ON problem_results.competition_id = ranked.competition_id
+        AND problem_results.user_id = ranked.user_id
+        LEFT JOIN problems
+        ON problems.id = problem_results.problem_id
+        ORDER BY ranked.rank_in_competition, ranked.total_runtime, ranked.user_id, problems.created_on;
+        """,
+        {"competition_id": competition_id, "parent_id": parent_id, "user_id": user_id},
+    )
+    result = await async_db.execute_one(query_tuple)
+    if result["result"]:
+        return group_results_by_user(result["result"])
     else:
         return []
 
 
-def get_competitions_by_organiser(organiser_id: uuid.UUID):
+async def get_competitions_by_organiser(organiser_id: uuid.UUID):
     query_tuple = (
         """SELECT * FROM competitions WHERE organiser_id = %s ORDER BY start_time DESC""",
         (organiser_id,),
     )
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     if result["result"]:
         return [Competition(**competition) for competition in result["result"]]
     else:
         return []
 
 
-def get_trophies_by_user(user_id: uuid.UUID):
+async def get_trophies_by_user(user_id: uuid.UUID):
     query_tuple = (
         """
         WITH total_points AS (
@@ -251,7 +352,7 @@ def get_trophies_by_user(user_id: uuid.UUID):
         competitions.name AS competition_name,
         top_3_in_each_competition.competition_id,
         top_3_in_each_competition.rn AS rank_in_competition,
-        trophies.icon
+        trophies.icon_sha
         FROM
         top_3_in_each_competition
         LEFT JOIN trophies ON top_3_in_each_competition.competition_id = trophies.competition_id
@@ -268,7 +369,7 @@ def get_trophies_by_user(user_id: uuid.UUID):
         """,
         (user_id,),
     )
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     if result["result"]:
         return result["result"]
     else:
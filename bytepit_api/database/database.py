@@ -1,31 +1,38 @@
 import sys
-import time
 
 from typing import List
 
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, ConnectionPool, PoolTimeout
 
 
 class Database:
-    def __init__(self, connection_string):
-        self.connection = self.connect(connection_string)
+    def __init__(self, connection_string, min_size=2, max_size=10, timeout=30.0, max_waiting=0):
+        self.pool = self.connect(connection_string, min_size, max_size, timeout, max_waiting)
 
-    def connect(self, connection_string, max_retries=3):
+    def connect(self, connection_string, min_size, max_size, timeout, max_waiting, max_retries=3):
         for _ in range(0, max_retries):
+            pool = ConnectionPool(
+                connection_string,
+                min_size=min_size,
+                max_size=max_size,
+                timeout=timeout,
+                max_waiting=max_waiting,
+                kwargs={"row_factory": dict_row, "autocommit": True},
+                check=ConnectionPool.check_connection,
+                open=True,
+            )
             try:
-                connection = psycopg.connect(connection_string, row_factory=dict_row, autocommit=True)
-                return connection
-            except psycopg.OperationalError as e:
+                pool.wait(timeout=timeout)
+                return pool
+            except PoolTimeout:
+                pool.close()
                 print("Unable to connect to database. Retrying...")
-                time.sleep(3)
         print("Unable to connect to database")
         sys.exit(1)
 
     def execute_one(self, query_tuple: tuple):
-        self._check_connection()
-        if self.connection.closed:
-            self.connection = self.connect(self.connection.dsn)
         try:
             assert isinstance(query_tuple[0], str), "Query must be a string"
             assert (
@@ -33,37 +40,118 @@ class Database:
             ), "Query parameters must be a dict, a tuple or None"
 
             query, params = query_tuple
-            cursor = self.connection.cursor()
-            cursor.execute(query, params)
-
-            if cursor.description is not None:
-                result = cursor.fetchall()
-                return {"result": result, "affected_rows": cursor.rowcount}
-            else:
-                return {"affected_rows": cursor.rowcount}
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute(query, params)
+
+                if cursor.description is not None:
+                    result = cursor.fetchall()
+                    return {"result": result, "affected_rows": cursor.rowcount}
+                else:
+                    return {"affected_rows": cursor.rowcount}
         except psycopg.Error as e:
             print(e)
             return {"affected_rows": 0}
 
     def execute_many(self, query_tuple_list: List[tuple]):
-        self._check_connection()
         try:
             total_affected_rows = 0
-            cursor = self.connection.cursor()
-            with self.connection.transaction():
-                for query, params in query_tuple_list:
-                    assert isinstance(query, str), "Query must be a string"
-                    assert (
-                        params is None or isinstance(params, tuple) or isinstance(params, dict)
-                    ), "Query parameters must be a dict, a tuple or None"
-
-                    cursor.execute(query, params)
-                    total_affected_rows += cursor.rowcount
-                return {"affected_rows": total_affected_rows}
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                with connection.transaction():
+                    for query, params in query_tuple_list:
+                        assert isinstance(query, str), "Query must be a string"
+                        assert (
+                            params is None or isinstance(params, tuple) or isinstance(params, dict)
+                        ), "Query parameters must be a dict, a tuple or None"
+
+                        cursor.execute(query, params)
+                        total_affected_rows += cursor.rowcount
+                    return {"affected_rows": total_affected_rows}
+        except psycopg.Error as e:
+            print(e)
+            return {"affected_rows": 0}
+
+    def get_stats(self):
+        return self.pool.get_stats()
+
+    def close(self):
+        self.pool.close()
+
+
+class AsyncDatabase:
+    def __init__(self, connection_string, min_size=2, max_size=10, timeout=30.0, max_waiting=0):
+        self.connection_string = connection_string
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        self.pool = None
+
+    async def open(self, max_retries=3):
+        for _ in range(0, max_retries):
+            self.pool = AsyncConnectionPool(
+                self.connection_string,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                timeout=self.timeout,
+                max_waiting=self.max_waiting,
+                kwargs={"row_factory": dict_row, "autocommit": True},
+                check=AsyncConnectionPool.check_connection,
+                open=False,
+            )
+            try:
+                await self.pool.open(wait=True, timeout=self.timeout)
+                return
+            except PoolTimeout:
+                await self.pool.close()
+                print("Unable to connect to database. Retrying...")
+        print("Unable to connect to database")
+        sys.exit(1)
+
+    async def execute_one(self, query_tuple: tuple):
+        try:
+            assert isinstance(query_tuple[0], str), "Query must be a string"
+            assert (
+                query_tuple[1] is None or isinstance(query_tuple[1], tuple) or isinstance(query_tuple[1], dict)
+            ), "Query parameters must be a dict, a tuple or None"
+
+            query, params = query_tuple
+            async with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                await cursor.execute(query, params)
+
+                if cursor.description is not None:
+                    result = await cursor.fetchall()
+                    return {"result": result, "affected_rows": cursor.rowcount}
+                else:
+                    return {"affected_rows": cursor.rowcount}
+        except psycopg.Error as e:
+            print(e)
+            return {"affected_rows": 0}
+
+    async def execute_many(self, query_tuple_list: List[tuple]):
+        try:
+            total_affected_rows = 0
+            async with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                async with connection.transaction():
+                    for query, params in query_tuple_list:
+                        assert isinstance(query, str), "Query must be a string"
+                        assert (
+                            params is None or isinstance(params, tuple) or isinstance(params, dict)
+                        ), "Query parameters must be a dict, a tuple or None"
+
+                        await cursor.execute(query, params)
+                        total_affected_rows += cursor.rowcount
+                    return {"affected_rows": total_affected_rows}
         except psycopg.Error as e:
             print(e)
             return {"affected_rows": 0}
 
-    def _check_connection(self):
-        if self.connection.closed:
-            self.connection = self.connect(self.connection.dsn)
+    def get_stats(self):
+        return self.pool.get_stats() if self.pool else {}
+
+    async def close(self):
+        if self.pool:
+            await self.pool.close()
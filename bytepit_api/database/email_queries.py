@@ -0,0 +1,72 @@
+import uuid
+
+from bytepit_api.database import db
+from bytepit_api.models.db_models import OutboundEmail
+
+
+def get_insert_outbound_email_query(recipient: str, subject: str, html: str, plaintext: str):
+    return (
+        "INSERT INTO outbound_emails (recipient, subject, html, plaintext) VALUES (%s, %s, %s, %s)",
+        (recipient, subject, html, plaintext),
+    )
+
+
+def claim_due_emails(limit: int):
+    query_tuple = (
+        """
+        UPDATE outbound_emails
+        SET status = 'sending', attempts = attempts + 1, updated_on = NOW()
+        WHERE id IN (
+            SELECT id FROM outbound_emails
+            WHERE status = 'pending' AND next_attempt_at <= NOW()
+            ORDER BY next_attempt_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING *
+        """,
+        (limit,),
+    )
+    result = db.execute_one(query_tuple)
+    if result.get("result"):
+        return [OutboundEmail(**outbound_email) for outbound_email in result["result"]]
+    else:
+        return []
+
+
+def set_email_sent(email_id: uuid.UUID):
+    query_tuple = (
+        "UPDATE outbound_emails SET status = 'sent', last_error = NULL, updated_on = NOW() WHERE id = %s",
+        (email_id,),
+    )
+    result = db.execute_one(query_tuple)
+    return result["affected_rows"] == 1
+
+
+def set_email_failed(email_id: uuid.UUID, error: str, retry_after_seconds: float, max_attempts: int):
+    query_tuple = (
+        """
+        UPDATE outbound_emails
+        SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+            last_error = %s,
+            next_attempt_at = NOW() + make_interval(secs => %s),
+            updated_on = NOW()
+        WHERE id = %s
+        """,
+        (max_attempts, error, retry_after_seconds, email_id),
+    )
+    result = db.execute_one(query_tuple)
+    return result["affected_rows"] == 1
+
+
+def requeue_stale_emails(stale_after_seconds: int):
+    query_tuple = (
+        """
+        UPDATE outbound_emails
+        SET status = 'pending', updated_on = NOW()
+        WHERE status = 'sending' AND updated_on < NOW() - make_interval(secs => %s)
+        """,
+        (stale_after_seconds,),
+    )
+    result = db.execute_one(query_tuple)
+    return result["affected_rows"]
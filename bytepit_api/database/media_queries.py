@@ -0,0 +1,27 @@
+from bytepit_api.database import async_db
+from bytepit_api.models.db_models import Media
+
+
+INSERT_MEDIA_QUERY = """
+    INSERT INTO media (sha, content, content_type) VALUES (%s, %s, %s)
+    ON CONFLICT (sha) DO NOTHING
+    RETURNING sha
+"""
+
+
+def get_insert_media_query(sha: str, content: bytes, content_type: str):
+    return (INSERT_MEDIA_QUERY, (sha, content, content_type))
+
+
+async def insert_media_async(sha: str, content: bytes, content_type: str):
+    result = await async_db.execute_one((INSERT_MEDIA_QUERY, (sha, content, content_type)))
+    return "result" in result
+
+
+async def get_media(sha: str):
+    query_tuple = ("SELECT sha, content, content_type FROM media WHERE sha = %s", (sha,))
+    result = await async_db.execute_one(query_tuple)
+    if result.get("result"):
+        return Media(**result["result"][0])
+    else:
+        return None
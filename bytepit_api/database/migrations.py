@@ -0,0 +1,172 @@
+from bytepit_api.database import db
+
+
+MIGRATIONS_LOCK_ID = 5_130_001
+
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS competition_standings (
+        competition_id UUID NOT NULL REFERENCES competitions(id) ON DELETE CASCADE,
+        user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        total_points DOUBLE PRECISION NOT NULL DEFAULT 0,
+        total_runtime DOUBLE PRECISION NOT NULL DEFAULT 0,
+        rank_in_competition INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (competition_id, user_id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS competition_standings_rank_idx
+    ON competition_standings (competition_id, rank_in_competition, total_runtime)
+    """,
+    """
+    INSERT INTO competition_standings (competition_id, user_id, total_points, total_runtime, rank_in_competition)
+    SELECT
+        competition_id,
+        user_id,
+        SUM(num_of_points),
+        SUM(average_runtime),
+        DENSE_RANK() OVER (PARTITION BY competition_id ORDER BY SUM(num_of_points) DESC)
+    FROM problem_results
+    WHERE competition_id IS NOT NULL
+    GROUP BY competition_id, user_id
+    ON CONFLICT (competition_id, user_id) DO UPDATE
+    SET total_points = EXCLUDED.total_points,
+        total_runtime = EXCLUDED.total_runtime,
+        rank_in_competition = EXCLUDED.rank_in_competition
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS submissions (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        problem_id UUID NOT NULL REFERENCES problems(id) ON DELETE CASCADE,
+        competition_id UUID REFERENCES competitions(id) ON DELETE CASCADE,
+        source_code TEXT NOT NULL,
+        language TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        tests_total INTEGER NOT NULL DEFAULT 0,
+        tests_done INTEGER NOT NULL DEFAULT 0,
+        result JSONB,
+        created_on TIMESTAMP NOT NULL DEFAULT NOW(),
+        updated_on TIMESTAMP NOT NULL DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS submissions_status_idx ON submissions (status, updated_on)
+    """,
+    """
+    ALTER TABLE competitions ADD COLUMN IF NOT EXISTS judging_policy TEXT NOT NULL DEFAULT 'full'
+    """,
+    """
+    ALTER TABLE submissions ADD COLUMN IF NOT EXISTS judging_policy TEXT NOT NULL DEFAULT 'full'
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS problem_tests (
+        problem_id UUID NOT NULL,
+        blob_name TEXT NOT NULL,
+        test_index INTEGER,
+        kind TEXT NOT NULL,
+        size BIGINT NOT NULL,
+        etag TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        PRIMARY KEY (problem_id, blob_name)
+    )
+    """,
+    """
+    ALTER TABLE users ADD COLUMN IF NOT EXISTS token_epoch INTEGER NOT NULL DEFAULT 0
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS outbound_emails (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        recipient TEXT NOT NULL,
+        subject TEXT NOT NULL,
+        html TEXT NOT NULL,
+        plaintext TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        created_on TIMESTAMP NOT NULL DEFAULT NOW(),
+        updated_on TIMESTAMP NOT NULL DEFAULT NOW()
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS outbound_emails_due_idx ON outbound_emails (status, next_attempt_at)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS media (
+        sha TEXT PRIMARY KEY,
+        content BYTEA NOT NULL,
+        content_type TEXT,
+        created_on TIMESTAMP NOT NULL DEFAULT NOW()
+    )
+    """,
+    """
+    ALTER TABLE users ADD COLUMN IF NOT EXISTS image_sha TEXT
+    """,
+    """
+    ALTER TABLE trophies ADD COLUMN IF NOT EXISTS icon_sha TEXT
+    """,
+    """
+    INSERT INTO media (sha, content)
+    SELECT encode(sha256(image), 'hex'), image FROM users WHERE image IS NOT NULL AND image_sha IS NULL
+    UNION
+    SELECT encode(sha256(icon), 'hex'), icon FROM trophies WHERE icon IS NOT NULL AND icon_sha IS NULL
+    ON CONFLICT (sha) DO NOTHING
+    """,
+    """
+    UPDATE users SET image_sha = encode(sha256(image), 'hex') WHERE image IS NOT NULL AND image_sha IS NULL
+    """,
+    """
+    UPDATE trophies SET icon_sha = encode(sha256(icon), 'hex') WHERE icon IS NOT NULL AND icon_sha IS NULL
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS competition_standings_cursor_idx
+    ON competition_standings (competition_id, rank_in_competition, total_runtime, user_id)
+    """,
+    """
+    DROP INDEX IF EXISTS competition_standings_rank_idx
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS competition_standings_points_idx
+    ON competition_standings (competition_id, total_points)
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'users_image_sha_fkey') THEN
+            ALTER TABLE users ADD CONSTRAINT users_image_sha_fkey FOREIGN KEY (image_sha) REFERENCES media(sha) NOT VALID;
+        END IF;
+    END
+    $$
+    """,
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'trophies_icon_sha_fkey') THEN
+            ALTER TABLE trophies ADD CONSTRAINT trophies_icon_sha_fkey FOREIGN KEY (icon_sha) REFERENCES media(sha) NOT VALID;
+        END IF;
+    END
+    $$
+    """,
+]
+
+
+def apply_migrations():
+    with db.pool.connection() as connection:
+        with connection.transaction():
+            cursor = connection.cursor()
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_ID,))
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    applied_on TIMESTAMP NOT NULL DEFAULT NOW()
+                )
+                """
+            )
+            cursor.execute("SELECT version FROM schema_migrations")
+            applied_versions = {row["version"] for row in cursor.fetchall()}
+            for version, migration in enumerate(MIGRATIONS, start=1):
+                if version not in applied_versions:
+                    cursor.execute(migration)
+                    cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
@@ -1,17 +1,17 @@
-from typing import Union
+from typing import List, Union
 import uuid
 
-from bytepit_api.database import db
-from bytepit_api.models.db_models import Problem, ProblemResult, Language
+from bytepit_api.database import async_db, db
+from bytepit_api.models.db_models import Problem, ProblemResult, ProblemTest, Language
 from bytepit_api.models.dtos import ProblemDTO, CreateProblemDTO
 
 
-def get_problems_by_competition(competition_id: uuid.UUID):
+async def get_problems_by_competition(competition_id: uuid.UUID):
     query_tuple = (
         """SELECT * FROM problems WHERE id IN (SELECT unnest(problems) FROM competitions WHERE id = %s);""",
         (competition_id,),
     )
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     if result["result"]:
         return [Problem(**problem) for problem in result["result"]]
     else:
@@ -53,9 +53,77 @@ def get_problem(problem_id: uuid.UUID):
 
 
 def delete_problem(problem_id: uuid.UUID):
-    query_tuple = ("DELETE FROM problems WHERE id = %s", (problem_id,))
-    result = db.execute_one(query_tuple)
-    return result["affected_rows"] == 1
+    params = {"problem_id": problem_id}
+    lock_query = (
+        """
+        SELECT pg_advisory_xact_lock(hashtext(competition_id::text))
+        FROM (
+            SELECT DISTINCT competition_id FROM problem_results
+            WHERE problem_id = %(problem_id)s AND competition_id IS NOT NULL
+            ORDER BY competition_id
+        ) AS affected
+        """,
+        params,
+    )
+    standings_update_query = (
+        """
+        UPDATE competition_standings
+        SET total_points = remaining.total_points, total_runtime = remaining.total_runtime
+        FROM (
+            SELECT affected.competition_id, affected.user_id,
+                SUM(other.num_of_points) AS total_points, SUM(other.average_runtime) AS total_runtime
+            FROM problem_results AS affected
+            JOIN problem_results AS other
+            ON other.competition_id = affected.competition_id
+            AND other.user_id = affected.user_id
+            AND other.problem_id <> affected.problem_id
+            WHERE affected.problem_id = %(problem_id)s AND affected.competition_id IS NOT NULL
+            GROUP BY affected.competition_id, affected.user_id
+        ) AS remaining
+        WHERE competition_standings.competition_id = remaining.competition_id
+        AND competition_standings.user_id = remaining.user_id
+        """,
+        params,
+    )
+    standings_delete_query = (
+        """
+        DELETE FROM competition_standings
+        USING problem_results AS affected
+        WHERE affected.problem_id = %(problem_id)s
+        AND competition_standings.competition_id = affected.competition_id
+        AND competition_standings.user_id = affected.user_id
+        AND NOT EXISTS (
+            SELECT 1 FROM problem_results AS other
+            WHERE other.competition_id = affected.competition_id
+            AND other.user_id = affected.user_id
+            AND other.problem_id <> affected.problem_id
+        )
+        """,
+        params,
+    )
+    rank_update_query = (
+        """
+        UPDATE competition_standings
+        SET rank_in_competition = ranked.rank_in_competition
+        FROM (
+            SELECT competition_id, user_id,
+                DENSE_RANK() OVER (PARTITION BY competition_id ORDER BY total_points DESC) AS rank_in_competition
+            FROM competition_standings
+            WHERE competition_id IN (
+                SELECT competition_id FROM problem_results WHERE problem_id = %(problem_id)s
+            )
+        ) AS ranked
+        WHERE competition_standings.competition_id = ranked.competition_id
+        AND competition_standings.user_id = ranked.user_id
+        AND competition_standings.rank_in_competition <> ranked.rank_in_competition
+        """,
+        params,
+    )
+    problem_delete_query = ("DELETE FROM problems WHERE id = %(problem_id)s", params)
+    result = db.execute_many(
+        [lock_query, standings_update_query, standings_delete_query, rank_update_query, problem_delete_query]
+    )
+    return result["affected_rows"] > 0
 
 
 def insert_problem(problem: CreateProblemDTO, organiser_id: uuid.UUID):
@@ -106,6 +174,48 @@ def modify_problem(problem_id: uuid.UUID, problem: ProblemDTO):
     return result["affected_rows"] == 1
 
 
+def get_problem_tests(problem_id: uuid.UUID):
+    query_tuple = (
+        "SELECT * FROM problem_tests WHERE problem_id = %s ORDER BY test_index NULLS LAST, kind",
+        (problem_id,),
+    )
+    result = db.execute_one(query_tuple)
+    if result["result"]:
+        return [ProblemTest(**problem_test) for problem_test in result["result"]]
+    else:
+        return []
+
+
+def replace_problem_tests(problem_id: uuid.UUID, problem_tests: List[ProblemTest]):
+    delete_query = ("DELETE FROM problem_tests WHERE problem_id = %s", (problem_id,))
+    insert_queries = [
+        (
+            """
+            INSERT INTO problem_tests (problem_id, blob_name, test_index, kind, size, etag, content_hash)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                problem_id,
+                problem_test.blob_name,
+                problem_test.test_index,
+                problem_test.kind,
+                problem_test.size,
+                problem_test.etag,
+                problem_test.content_hash,
+            ),
+        )
+        for problem_test in problem_tests
+    ]
+    result = db.execute_many([delete_query, *insert_queries])
+    return result["affected_rows"] >= len(problem_tests)
+
+
+def delete_problem_tests(problem_id: uuid.UUID):
+    query_tuple = ("DELETE FROM problem_tests WHERE problem_id = %s", (problem_id,))
+    result = db.execute_one(query_tuple)
+    return result["affected_rows"] > 0
+
+
 def insert_problem_result(
     problem_id: uuid.UUID,
     competition_id: Union[uuid.UUID, None],
@@ -158,7 +268,87 @@ def insert_problem_result(
             },
         )
     result = db.execute_one(query_tuple)
-    return result["affected_rows"] == 1
+    has_improved = result["affected_rows"] == 1
+    if has_improved and competition_id:
+        update_competition_standings(competition_id, user_id)
+    return has_improved
+
+
+def update_competition_standings(competition_id: uuid.UUID, user_id: uuid.UUID):
+    params = {"competition_id": competition_id, "user_id": user_id}
+    lock_query = ("SELECT pg_advisory_xact_lock(hashtext(%(competition_id)s::text))", params)
+    rank_shift_query = (
+        """
+        WITH change AS (
+            SELECT
+                target.new_points,
+                current.old_points,
+                NOT EXISTS (
+                    SELECT 1 FROM competition_standings
+                    WHERE competition_id = %(competition_id)s AND user_id <> %(user_id)s
+                    AND total_points = target.new_points
+                ) AS is_new_points,
+                current.old_points IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM competition_standings
+                    WHERE competition_id = %(competition_id)s AND user_id <> %(user_id)s
+                    AND total_points = current.old_points
+                ) AS is_vacated_points
+            FROM (
+                SELECT SUM(num_of_points) AS new_points
+                FROM problem_results
+                WHERE competition_id = %(competition_id)s AND user_id = %(user_id)s
+            ) AS target
+            LEFT JOIN (
+                SELECT total_points AS old_points
+                FROM competition_standings
+                WHERE competition_id = %(competition_id)s AND user_id = %(user_id)s
+            ) AS current ON TRUE
+            WHERE current.old_points IS NULL OR target.new_points > current.old_points
+        )
+        UPDATE competition_standings
+        SET rank_in_competition = rank_in_competition + change.is_new_points::int
+            - (change.is_vacated_points AND total_points < change.old_points)::int
+        FROM change
+        WHERE competition_standings.competition_id = %(competition_id)s
+        AND competition_standings.user_id <> %(user_id)s
+        AND competition_standings.total_points < change.new_points
+        AND change.is_new_points::int - (change.is_vacated_points AND total_points < change.old_points)::int <> 0
+        """,
+        params,
+    )
+    standings_upsert_query = (
+        """
+        INSERT INTO competition_standings (competition_id, user_id, total_points, total_runtime)
+        SELECT competition_id, user_id, SUM(num_of_points), SUM(average_runtime)
+        FROM problem_results
+        WHERE competition_id = %(competition_id)s AND user_id = %(user_id)s
+        GROUP BY competition_id, user_id
+        ON CONFLICT (competition_id, user_id) DO UPDATE
+        SET total_points = EXCLUDED.total_points, total_runtime = EXCLUDED.total_runtime
+        """,
+        params,
+    )
+    rank_update_query = (
+        """
+        UPDATE competition_standings AS standing
+        SET rank_in_competition = COALESCE(
+            (
+                SELECT MIN(other.rank_in_competition) FROM competition_standings AS other
+                WHERE other.competition_id = standing.competition_id AND other.user_id <> standing.user_id
+                AND other.total_points = standing.total_points
+            ),
+            (
+                SELECT MAX(other.rank_in_competition) + 1 FROM competition_standings AS other
+                WHERE other.competition_id = standing.competition_id AND other.total_points > standing.total_points
+            ),
+            1
+        )
+        WHERE standing.competition_id = %(competition_id)s AND standing.user_id = %(user_id)s
+        """,
+        params,
+    )
+    result = db.execute_many([lock_query, rank_shift_query, standings_upsert_query, rank_update_query])
+    return result["affected_rows"] > 0
 
 
 def get_problem_result(problem_id: uuid.UUID, user_id: uuid.UUID, competition_id: Union[uuid.UUID, None] = None):
@@ -185,7 +375,7 @@ def get_problem_result(problem_id: uuid.UUID, user_id: uuid.UUID, competition_id
         return None
 
 
-def get_user_statistics(user_id: uuid.UUID):
+async def get_user_statistics(user_id: uuid.UUID):
     query_tuple = (
         """
         SELECT COUNT(*) AS total_submissions, SUM(CAST(is_correct AS INT)) AS correct_submissions
@@ -194,7 +384,7 @@ def get_user_statistics(user_id: uuid.UUID):
         """,
         (user_id,),
     )
-    result = db.execute_one(query_tuple)
+    result = await async_db.execute_one(query_tuple)
     if result["result"]:
         return result["result"][0]
     else:
@@ -214,59 +404,3 @@ def get_problems_by_organiser(organiser_id: uuid.UUID):
         return [Problem(**problem) for problem in result["result"]]
     else:
         return []
-
-
-def get_virtual_competition_results_for_user(competition_id: uuid.UUID, user_id: uuid.UUID):
-    query_tuple = (
-        """
-        SELECT
-            problems.name,
-            problems.num_of_points AS max_num_of_points,
-            problems.created_on AS created_on,
-            problem_results.*
-        FROM problem_results
-        JOIN problems
-        ON problems.id = problem_results.problem_id
-        JOIN competitions
-        ON competitions.id = problem_results.competition_id 
-        WHERE problem_results.user_id = %s
-		AND competitions.parent_id = %s;
-        """,
-        (
-            user_id,
-            competition_id,
-        ),
-    )
-    result = db.execute_one(query_tuple)
-    if not result:
-        return None
-    user_result = {
-        "user_id": user_id,
-        "total_points": 0,
-        "problem_results": [],
-        "rank_in_competition": -1,
-    }
-
-    for problem in result["result"]:
-        user_result["problem_results"].append(
-            {
-                "id": problem["id"],
-                "problem_id": problem["problem_id"],
-                "user_id": problem["user_id"],
-                "competition_id": problem["competition_id"],
-                "num_of_points": problem["num_of_points"],
-                "max_num_of_points": problem["max_num_of_points"],
-                "created_on": problem["created_on"],
-                "source_code": problem["source_code"],
-                "language": problem["language"],
-                "average_runtime": problem["average_runtime"],
-                "is_correct": problem["is_correct"],
-            }
-        )
-        user_result["total_points"] += problem["num_of_points"]
-
-    user_result["problem_results"] = sorted(user_result["problem_results"], key=lambda x: x["created_on"])
-    for problem_result in user_result["problem_results"]:
-        del problem_result["created_on"]
-
-    return user_result
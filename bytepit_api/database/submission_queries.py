@@ -0,0 +1,113 @@
+import uuid
+
+from psycopg.types.json import Jsonb
+
+from bytepit_api.database import db
+from bytepit_api.models.db_models import JudgingPolicy, Submission
+from bytepit_api.models.dtos import CreateSubmissionDTO
+
+
+def insert_submission(user_id: uuid.UUID, submission: CreateSubmissionDTO, judging_policy: JudgingPolicy):
+    query_tuple = (
+        """
+        INSERT INTO submissions (user_id, problem_id, competition_id, source_code, language, judging_policy)
+        VALUES (%s, %s, %s, %s, %s, %s) RETURNING *
+        """,
+        (
+            user_id,
+            submission.problem_id,
+            submission.competition_id,
+            submission.source_code,
+            submission.language,
+            judging_policy,
+        ),
+    )
+    result = db.execute_one(query_tuple)
+    if result["affected_rows"] == 1:
+        return Submission(**result["result"][0])
+    else:
+        return None
+
+
+def get_submission(submission_id: uuid.UUID):
+    query_tuple = ("SELECT * FROM submissions WHERE id = %s", (submission_id,))
+    result = db.execute_one(query_tuple)
+    if result["result"]:
+        return Submission(**result["result"][0])
+    else:
+        return None
+
+
+def claim_submission(submission_id: uuid.UUID):
+    query_tuple = (
+        """
+        UPDATE submissions
+        SET status = 'running', tests_done = 0, updated_on = NOW()
+        WHERE id = %s AND status = 'queued'
+        RETURNING *
+        """,
+        (submission_id,),
+    )
+    result = db.execute_one(query_tuple)
+    if result.get("result"):
+        return Submission(**result["result"][0])
+    else:
+        return None
+
+
+def set_submission_tests_total(submission_id: uuid.UUID, tests_total: int):
+    query_tuple = (
+        "UPDATE submissions SET tests_total = %s, updated_on = NOW() WHERE id = %s",
+        (tests_total, submission_id),
+    )
+    result = db.execute_one(query_tuple)
+    return result["affected_rows"] == 1
+
+
+def increment_submission_tests_done(submission_id: uuid.UUID):
+    query_tuple = (
+        "UPDATE submissions SET tests_done = tests_done + 1, updated_on = NOW() WHERE id = %s",
+        (submission_id,),
+    )
+    result = db.execute_one(query_tuple)
+    return result["affected_rows"] == 1
+
+
+def set_submission_tests_done(submission_id: uuid.UUID, tests_done: int):
+    query_tuple = (
+        "UPDATE submissions SET tests_done = %s, updated_on = NOW() WHERE id = %s",
+        (tests_done, submission_id),
+    )
+    result = db.execute_one(query_tuple)
+    return result["affected_rows"] == 1
+
+
+def finish_submission(submission_id: uuid.UUID, submission_result: dict):
+    query_tuple = (
+        "UPDATE submissions SET status = 'done', result = %s, updated_on = NOW() WHERE id = %s",
+        (Jsonb(submission_result), submission_id),
+    )
+    result = db.execute_one(query_tuple)
+    return result["affected_rows"] == 1
+
+
+def requeue_stale_submissions(stale_after_seconds: int):
+    query_tuple = (
+        """
+        UPDATE submissions
+        SET status = 'queued', updated_on = NOW()
+        WHERE status = 'running' AND updated_on < NOW() - make_interval(secs => %s)
+        """,
+        (stale_after_seconds,),
+    )
+    result = db.execute_one(query_tuple)
+    return result["affected_rows"]
+
+
+def get_queued_submission_ids():
+    query_tuple = ("SELECT id FROM submissions WHERE status = 'queued' ORDER BY created_on", ())
+    result = db.execute_one(query_tuple)
+    if result["result"]:
+        return [submission["id"] for submission in result["result"]]
+    else:
+        return []
@@ -1,7 +1,7 @@
 import os
 
 from urllib.parse import unquote
-from typing import Annotated, Dict, Optional
+from typing import Annotated, Dict, Optional, Union
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.openapi.models import OAuthFlows as OAuthFlowsModel
@@ -13,7 +13,7 @@ from jose import JWTError, jwt
 
 from bytepit_api.helpers import auth_helpers
 from bytepit_api.models.db_models import User
-from bytepit_api.models.shared import TokenData
+from bytepit_api.models.shared import Principal, TokenData
 
 
 class OAuth2PasswordBearerWithCookie(OAuth2):
@@ -67,31 +67,38 @@ def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = auth_helpers.get_user_by_email_or_username(identifier=token_data.email)
+    if "epoch" in payload:
+        principal = auth_helpers.get_principal_from_claims(payload)
+        if principal is None:
+            raise credentials_exception
+        return principal
+    user = auth_helpers.get_principal(token_data.email)
     if user is None:
         raise credentials_exception
     return user
 
 
-def get_current_verified_user(current_user: Annotated[User, Depends(get_current_user)]):
+def get_current_verified_user(current_user: Annotated[Union[User, Principal], Depends(get_current_user)]):
     if not current_user.is_verified:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
     return current_user
 
 
-def get_current_admin_user(current_user: Annotated[User, Depends(get_current_verified_user)]):
+def get_current_admin_user(current_user: Annotated[Union[User, Principal], Depends(get_current_verified_user)]):
     if not current_user.role == "admin":
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User is not admin")
     return current_user
 
 
-def get_current_organiser_user(current_user: Annotated[User, Depends(get_current_verified_user)]):
+def get_current_organiser_user(current_user: Annotated[Union[User, Principal], Depends(get_current_verified_user)]):
     if not current_user.role == "organiser" and not current_user.role == "admin":
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User is not organiser")
     return current_user
 
 
-def get_current_approved_organiser(current_user: Annotated[User, Depends(get_current_organiser_user)]):
+def get_current_approved_organiser(
+    current_user: Annotated[Union[User, Principal], Depends(get_current_organiser_user)]
+):
     if not current_user.approved_by_admin:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User is not approved by admin")
     return current_user
@@ -1,19 +1,56 @@
+import asyncio
 import os
 import secrets
+import threading
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
 
 from datetime import datetime, timedelta, timezone
 from typing import Union
 
+from fastapi.concurrency import run_in_threadpool
 from jose import jwt
 from passlib.context import CryptContext
 
 from bytepit_api.database import auth_queries
+from bytepit_api.helpers.cache_helpers import LRUCache
+from bytepit_api.models.db_models import User
+from bytepit_api.models.shared import Principal
 
 
 SECRET_KEY = os.environ["SECRET_KEY"]
 ALGORITHM = "HS256"
+TOKEN_CLAIMS_ENABLED = os.environ.get("AUTH_TOKEN_CLAIMS", "false").lower() == "true"
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+PASSWORD_HASHING_CONCURRENCY = int(os.environ.get("PASSWORD_HASHING_CONCURRENCY", 4))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASHING_CONCURRENCY,
+    thread_name_prefix="password",
+)
+password_stats = {"queued": 0, "running": 0, "completed": 0, "failed": 0, "wait_time": 0.0, "run_time": 0.0}
+password_stats_lock = threading.Lock()
+
+principal_cache = LRUCache(
+    max_size=int(os.environ.get("AUTH_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("AUTH_CACHE_TTL", 60)),
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+token_epoch_cache = LRUCache(
+    max_size=int(os.environ.get("AUTH_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("TOKEN_EPOCH_CACHE_TTL", 30)),
+)
 
 
 def get_password_hash(password):
@@ -28,6 +65,54 @@ def verify_password(plain_password, password_hash):
     return pwd_context.verify(plain_password, password_hash)
 
 
+def run_password_task(func, *args):
+    queued_at = time.perf_counter()
+    with password_stats_lock:
+        password_stats["queued"] += 1
+
+    def task():
+        started_at = time.perf_counter()
+        with password_stats_lock:
+            password_stats["queued"] -= 1
+            password_stats["running"] += 1
+            password_stats["wait_time"] += started_at - queued_at
+        failed = True
+        try:
+            result = func(*args)
+            failed = False
+            return result
+        finally:
+            with password_stats_lock:
+                password_stats["running"] -= 1
+                password_stats["failed" if failed else "completed"] += 1
+                password_stats["run_time"] += time.perf_counter() - started_at
+
+    return asyncio.wrap_future(password_executor.submit(task))
+
+
+async def get_password_hash_async(password: str):
+    return await run_password_task(pwd_context.hash, password)
+
+
+async def verify_and_update_password_async(plain_password: str, password_hash: str):
+    return await run_password_task(pwd_context.verify_and_update, plain_password, password_hash)
+
+
+def get_password_hashing_stats():
+    with password_stats_lock:
+        stats = dict(password_stats)
+    finished = stats["completed"] + stats["failed"]
+    stats.update(
+        {
+            "max_workers": PASSWORD_HASHING_CONCURRENCY,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "average_wait_time": stats["wait_time"] / finished if finished else 0.0,
+            "average_run_time": stats["run_time"] / finished if finished else 0.0,
+        }
+    )
+    return stats
+
+
 def check_if_email(identifier: str) -> bool:
     return "@" in identifier
 
@@ -38,12 +123,70 @@ def get_user_by_email_or_username(identifier: str):
     return user
 
 
-def authenticate_user(identifier: str, password: str):
-    user = get_user_by_email_or_username(identifier)
+def get_principal(identifier: str):
+    user = principal_cache.get(identifier)
+    if user is None:
+        user = get_user_by_email_or_username(identifier)
+        if user is not None:
+            principal_cache.set(identifier, user)
+    return user
+
+
+def invalidate_principal(username: Union[str, None] = None, user_id: Union[uuid.UUID, None] = None):
+    principal_cache.invalidate_where(lambda _, user: user.username == username or user.id == user_id)
+    token_epoch_cache.invalidate_where(lambda key, value: value["username"] == username or key == user_id)
+
+
+def get_token_epoch(user_id: uuid.UUID):
+    value = token_epoch_cache.get(user_id)
+    if value is None:
+        value = auth_queries.get_token_epoch(user_id)
+        if value is None:
+            return None
+        token_epoch_cache.set(user_id, value)
+    return value["token_epoch"]
+
+
+def get_token_claims(user: User):
+    claims = {"sub": user.email}
+    if TOKEN_CLAIMS_ENABLED:
+        claims.update(
+            {
+                "uid": str(user.id),
+                "role": user.role.value,
+                "ver": user.is_verified,
+                "apr": user.approved_by_admin,
+                "epoch": user.token_epoch,
+            }
+        )
+    return claims
+
+
+def get_principal_from_claims(payload: dict):
+    principal = Principal(
+        id=payload["uid"],
+        email=payload["sub"],
+        role=payload["role"],
+        is_verified=payload["ver"],
+        approved_by_admin=payload["apr"],
+        token_epoch=payload["epoch"],
+    )
+    if get_token_epoch(principal.id) != principal.token_epoch:
+        return None
+    return principal
+
+
+async def authenticate_user(identifier: str, password: str):
+    user = await run_in_threadpool(get_user_by_email_or_username, identifier)
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    is_valid, new_password_hash = await verify_and_update_password_async(password, user.password_hash)
+    if not is_valid:
         return False
+    if new_password_hash is not None and await run_in_threadpool(
+        auth_queries.update_password_hash, user.id, new_password_hash
+    ):
+        user.password_hash = new_password_hash
     return user
 
 
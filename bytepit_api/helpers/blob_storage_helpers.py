@@ -1,90 +1,252 @@
+import hashlib
+import os
+import sys
+import tempfile
 import uuid
 
-from typing import BinaryIO, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import BinaryIO, Dict, Iterable, List, Mapping, Union
 
 
-from fastapi import HTTPException
+from fastapi import HTTPException, Response, status
 from fastapi.responses import StreamingResponse
 
 
-from bytepit_api.database import blob_storage_container, blob_service_client
+from bytepit_api.database import problem_queries
+from bytepit_api.helpers import http_helpers, pack_helpers, upload_helpers
+from bytepit_api.helpers.cache_helpers import LRUCache
+from bytepit_api.models.db_models import ProblemTest
+from bytepit_api.storage import storage
+from bytepit_api.storage.backends import BlobModifiedError, BlobNotFoundError
 
 
-def response_stream(data: Iterable[bytes], status: int = 200, download: bool = False) -> StreamingResponse:
+TESTS_PACK_NAME = "tests.pack"
+
+blob_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("BLOB_UPLOAD_CONCURRENCY", 8)),
+    thread_name_prefix="blob",
+)
+
+tests_cache = LRUCache(
+    max_size=int(os.environ.get("TESTS_CACHE_SIZE", 64)),
+    ttl=float(os.environ.get("TESTS_CACHE_TTL", 300)),
+)
+
+
+def response_stream(
+    data: Iterable[bytes],
+    status: int = 200,
+    download: bool = False,
+    headers: Union[Mapping[str, str], None] = None,
+    media_type: Union[str, None] = None,
+) -> StreamingResponse:
     if download:
-        return StreamingResponse(content=data, status_code=status, media_type="application/octet-stream")
-    else:
         return StreamingResponse(
-            content=data,
-            status_code=status,
+            content=data, status_code=status, headers=headers, media_type="application/octet-stream"
         )
+    else:
+        return StreamingResponse(content=data, status_code=status, headers=headers, media_type=media_type)
 
 
 def upload_blob(filename: str, data: BinaryIO):
     try:
-        blob_service_client.get_blob_client(container=blob_storage_container, blob=filename).upload_blob(data)
-        return {"message": "File uploaded successfully in blob storage"}
+        properties = storage.upload(filename, data)
+        return {"message": "File uploaded successfully in blob storage", "etag": properties.etag}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def get_blob(fullpath: str):
+async def get_blob_async(fullpath: str, request_headers: Union[Mapping[str, str], None] = None):
+    request_headers = request_headers or {}
     try:
-        blob_client = blob_service_client.get_blob_client(container=blob_storage_container, blob=fullpath)
-        return response_stream(data=blob_client.download_blob().chunks(), download=False)
+        properties = await storage.get_properties_async(fullpath)
+        headers = http_helpers.get_cache_headers(properties.etag, properties.last_modified)
+        if http_helpers.etag_matches(request_headers.get("if-none-match"), properties.etag):
+            return Response(status_code=304, headers=headers)
+        headers["Accept-Ranges"] = "bytes"
+        media_type = http_helpers.get_content_type(fullpath, properties.content_type)
+        if_range = request_headers.get("if-range")
+        try:
+            if if_range and if_range != headers["ETag"]:
+                byte_range = None
+            else:
+                byte_range = http_helpers.parse_range_header(request_headers.get("range"), properties.size)
+        except http_helpers.RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{properties.size}"})
+        if byte_range is None:
+            chunks = await storage.open_stream(fullpath, etag=properties.etag)
+            headers["Content-Length"] = str(properties.size)
+            return response_stream(data=chunks, headers=headers, media_type=media_type)
+        start, end = byte_range
+        chunks = await storage.open_stream(fullpath, offset=start, length=end - start + 1, etag=properties.etag)
+        headers["Content-Length"] = str(end - start + 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{properties.size}"
+        return response_stream(data=chunks, status=206, headers=headers, media_type=media_type)
+    except BlobNotFoundError:
+        raise HTTPException(status_code=404, detail=f"File {fullpath} not found")
+    except BlobModifiedError:
+        raise HTTPException(status_code=409, detail=f"File {fullpath} changed during download")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 def blob_to_text(fullpath: str):
-    try:
-        blob_client = blob_service_client.get_blob_client(container=blob_storage_container, blob=fullpath)
-        return blob_client.download_blob(max_concurrency=1, encoding="UTF-8").readall()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return blob_to_bytes(fullpath).decode("utf-8")
 
 
-def download_blob(filename: str):
+def blob_to_bytes(fullpath: str):
     try:
-        blob_client = blob_service_client.get_blob_client(container=blob_storage_container, blob=filename)
-        return response_stream(data=blob_client.download_blob().chunks(), download=True)
+        return storage.read(fullpath)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 def delete_blob(filename: str):
-    try:
-        blob_service_client.get_blob_client(container=blob_storage_container, blob=filename).delete_blob()
-        return {"message": "File deleted successfully in blob storage"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    failed_files = storage.delete_many([filename])
+    if failed_files:
+        raise HTTPException(status_code=500, detail=failed_files[filename])
+    return {"message": "File deleted successfully in blob storage"}
+
+
+def delete_blobs(blob_names: List[str]):
+    return storage.delete_many(blob_names)
 
 
 def delete_all_blobs(problem_id: uuid.UUID):
     try:
-        files_to_delete = blob_service_client.get_container_client(container=blob_storage_container).list_blobs(
-            name_starts_with=f"{problem_id}"
-        )
-        for file in files_to_delete:
-            delete_blob(file.name)
+        problem_tests = problem_queries.get_problem_tests(problem_id)
+        if problem_tests:
+            files_to_delete = [problem_test.blob_name for problem_test in problem_tests]
+        else:
+            files_to_delete = [file.name for file in storage.list(f"{problem_id}/")]
+        failed_files = delete_blobs(files_to_delete)
+        if failed_files:
+            raise HTTPException(
+                status_code=500, detail={"message": "Could not delete test files", "failed_files": failed_files}
+            )
+        problem_queries.delete_problem_tests(problem_id)
+        invalidate_tests(problem_id)
         return {"message": "Files deleted successfully in blob storage"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def invalidate_tests(problem_id: uuid.UUID):
+    tests_cache.invalidate_where(lambda key, _: key[0] == str(problem_id))
+
+
 def get_all_tests(problem_id: uuid.UUID):
+    return get_cached_tests(problem_id)["tests"]
+
+
+def get_cached_tests(problem_id: uuid.UUID):
     try:
-        all_tests = blob_service_client.get_container_client(container=blob_storage_container).list_blobs(
-            name_starts_with=f"{problem_id}"
-        )
-        tests = {}
-        for test in all_tests:
-            test_file = blob_to_text(test.name)
-            test_idx = test.name.split("/")[1].split("_")[0]
-            if test.name.endswith("in.txt"):
-                tests[test_idx] = {"in": test_file}
-            else:
-                tests[test_idx]["out"] = test_file
-        return tests
+        problem_tests = problem_queries.get_problem_tests(problem_id)
+        version = get_manifest_version(problem_tests) if problem_tests else None
+        cache_key = (str(problem_id), version)
+        cached_tests = tests_cache.get(cache_key)
+        if cached_tests is not None:
+            return cached_tests
+        if problem_tests:
+            cached_tests = get_manifest_tests(problem_id, problem_tests, version)
+        else:
+            cached_tests = get_packed_tests(problem_id)
+        if cached_tests is None:
+            cached_tests = get_unpacked_tests(problem_id)
+        tests_cache.set(cache_key, cached_tests)
+        return cached_tests
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def get_manifest_version(problem_tests: List[ProblemTest]):
+    manifest = sorted(f"{problem_test.blob_name}:{problem_test.content_hash}" for problem_test in problem_tests)
+    return hashlib.sha256("\n".join(manifest).encode("utf-8")).hexdigest()
+
+
+def get_manifest_tests(problem_id: uuid.UUID, problem_tests: List[ProblemTest], version: str):
+    packs = [problem_test for problem_test in problem_tests if problem_test.kind == "pack"]
+    if packs:
+        data = blob_to_bytes(packs[0].blob_name)
+        if hashlib.sha256(data).hexdigest() != packs[0].content_hash:
+            raise ValueError(f"Test pack for problem {problem_id} does not match its manifest")
+        files = {name: content.decode("utf-8") for name, content in pack_helpers.unpack_files(data).items()}
+    else:
+        files = {problem_test.blob_name: blob_to_text(problem_test.blob_name) for problem_test in problem_tests}
+    return {"version": version, "tests": pack_helpers.group_tests(files)}
+
+
+def get_packed_tests(problem_id: uuid.UUID):
+    try:
+        data, properties = storage.download(f"{problem_id}/{TESTS_PACK_NAME}")
+    except BlobNotFoundError:
+        return None
+    files = pack_helpers.unpack_files(data)
+    tests = pack_helpers.group_tests({name: content.decode("utf-8") for name, content in files.items()})
+    return {"version": properties.etag, "tests": tests}
+
+
+def get_unpacked_tests(problem_id: uuid.UUID):
+    all_tests = storage.list(f"{problem_id}/")
+    files = {}
+    etags = []
+    for test in all_tests:
+        if not pack_helpers.TEST_FILE_PATTERN.match(test.name.split("/")[-1]):
+            continue
+        files[test.name] = blob_to_text(test.name)
+        etags.append(f"{test.name}:{test.etag}")
+    version = hashlib.sha256("\n".join(sorted(etags)).encode("utf-8")).hexdigest()
+    return {"version": version, "tests": pack_helpers.group_tests(files)}
+
+
+def upload_test_blob(
+    problem_id: uuid.UUID, file_name: str, file: BinaryIO, max_size: int = upload_helpers.MAX_TEST_FILE_SIZE
+):
+    blob_name = f"{problem_id}/{file_name}"
+    reader = upload_helpers.HashingReader(file, max_size)
+    result = upload_blob(blob_name, reader)
+    match = pack_helpers.TEST_FILE_PATTERN.match(file_name)
+    return ProblemTest(
+        problem_id=problem_id,
+        blob_name=blob_name,
+        test_index=int(match.group(1)) if match else None,
+        kind=match.group(2) if match else "pack",
+        size=reader.size,
+        etag=result["etag"],
+        content_hash=reader.hexdigest(),
+    )
+
+
+def upload_test_blobs(problem_id: uuid.UUID, files: Dict[str, BinaryIO]):
+    futures = {
+        blob_executor.submit(upload_test_blob, problem_id, file_name, file): file_name
+        for file_name, file in files.items()
+    }
+    problem_tests = []
+    failed_files = {}
+    for future in as_completed(futures):
+        try:
+            problem_tests.append(future.result())
+        except HTTPException as e:
+            failed_files[futures[future]] = {"status_code": e.status_code, "detail": e.detail}
+    if failed_files:
+        delete_blobs([problem_test.blob_name for problem_test in problem_tests])
+        too_large = all(
+            failure["status_code"] == status.HTTP_413_CONTENT_TOO_LARGE for failure in failed_files.values()
+        )
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE if too_large else status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail={"message": "Could not upload test files", "failed_files": failed_files},
+        )
+    return problem_tests
+
+
+def upload_tests_pack(problem_id: uuid.UUID, files: Dict[str, BinaryIO]):
+    with tempfile.SpooledTemporaryFile(max_size=pack_helpers.PACK_SPOOL_SIZE) as pack_file:
+        pack_helpers.write_pack(files, pack_file)
+        pack_file.seek(0)
+        return upload_test_blob(problem_id, TESTS_PACK_NAME, pack_file, sys.maxsize)
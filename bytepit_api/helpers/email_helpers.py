@@ -1,66 +1,151 @@
 import os
+import threading
+
+from string import Template
+
 from azure.communication.email import EmailClient
 
+from bytepit_api.database import email_queries
+from bytepit_api.models.db_models import OutboundEmail
+
 client = EmailClient.from_connection_string(os.environ.get("COMMUNICATION_SERVICES_CONNECTION_STRING"))
 
+UI_URL = os.environ.get("UI_URL", "https://bytepit.cloud")
+SENDER_ADDRESS = "DoNotReply@bytepit.cloud"
 
-async def send_verification_email(email, token):
-    message_html = f"""
-    <html>
-        <head>
-            <style>
-                body, table, td, p, h1, a {{
-                    text-align: center;
-                    margin: 0 auto;
-                }}
-
-                h1 {{
-                    color: #4338CA;
-                    font-size: 40px;
-                    margin-bottom: 20px;
-                }}
-
-                .button-link, .button-link:link, .button-link:visited, .button-link:hover, .button-link:active {{
-                    background-color: #4338CA;
-                    border: none;
-                    color: white !important;
-                    padding: 15px 32px;
-                    text-decoration: none;
-                    font-size: 16px;
-                    border-radius: 5px;
-                    display: inline-block;
-                    margin-top: 20px;
-                    text-decoration: none;
-                }}
-            </style>
-        </head>
-        <body>
-            <table width="100%" cellpadding="0" cellspacing="0" border="0">
-                <tr>
-                    <td>
-                        <h1>BytePit</h1>
-                        <h3>Please confirm your email by clicking on the button:</h3>
-                        <a href="{os.environ.get("UI_URL", "https://bytepit.cloud")}/confirm-email/{token}" class="button-link">CONFIRM</a>
-                    </td>
-                </tr>
-            </table>
-        </body>
-    </html>
+EMAIL_BATCH_SIZE = int(os.environ.get("EMAIL_BATCH_SIZE", 20))
+EMAIL_POLL_INTERVAL = float(os.environ.get("EMAIL_POLL_INTERVAL", 5))
+EMAIL_SEND_TIMEOUT = float(os.environ.get("EMAIL_SEND_TIMEOUT", 30))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", 8))
+EMAIL_RETRY_BASE_DELAY = float(os.environ.get("EMAIL_RETRY_BASE_DELAY", 10))
+EMAIL_RETRY_MAX_DELAY = float(os.environ.get("EMAIL_RETRY_MAX_DELAY", 3600))
+EMAIL_STALE_AFTER_SECONDS = int(os.environ.get("EMAIL_STALE_AFTER_SECONDS", 300))
 
+VERIFICATION_EMAIL_SUBJECT = "BytePit - Confirm your email"
+VERIFICATION_EMAIL_HTML = Template(
     """
+<html>
+    <head>
+        <style>
+            body, table, td, p, h1, a {
+                text-align: center;
+                margin: 0 auto;
+            }
+
+            h1 {
+                color: #4338CA;
+                font-size: 40px;
+                margin-bottom: 20px;
+            }
+
+            .button-link, .button-link:link, .button-link:visited, .button-link:hover, .button-link:active {
+                background-color: #4338CA;
+                border: none;
+                color: white !important;
+                padding: 15px 32px;
+                text-decoration: none;
+                font-size: 16px;
+                border-radius: 5px;
+                display: inline-block;
+                margin-top: 20px;
+                text-decoration: none;
+            }
+        </style>
+    </head>
+    <body>
+        <table width="100%" cellpadding="0" cellspacing="0" border="0">
+            <tr>
+                <td>
+                    <h1>BytePit</h1>
+                    <h3>Please confirm your email by clicking on the button:</h3>
+                    <a href="$confirm_url" class="button-link">CONFIRM</a>
+                </td>
+            </tr>
+        </table>
+    </body>
+</html>
+"""
+)
+VERIFICATION_EMAIL_PLAINTEXT = Template("Please confirm your email by clicking on the link: $confirm_url")
+
+email_wakeup = threading.Event()
+email_stop = threading.Event()
+email_senders = []
+
+
+def render_verification_email(email: str, token: str):
+    confirm_url = f"{UI_URL}/confirm-email/{token}"
+    return {
+        "recipient": email,
+        "subject": VERIFICATION_EMAIL_SUBJECT,
+        "html": VERIFICATION_EMAIL_HTML.substitute(confirm_url=confirm_url),
+        "plaintext": VERIFICATION_EMAIL_PLAINTEXT.substitute(confirm_url=confirm_url),
+    }
+
+
+def wake_email_sender():
+    email_wakeup.set()
+
+
+def deliver_email(outbound_email: OutboundEmail):
     message = {
-        "senderAddress": "DoNotReply@bytepit.cloud",
-        "recipients": {"to": [{"address": email}]},
+        "senderAddress": SENDER_ADDRESS,
+        "recipients": {"to": [{"address": outbound_email.recipient}]},
         "content": {
-            "subject": "BytePit - Confirm your email",
-            "html": message_html,
-            "plaintext": f"Please confirm your email by clicking on the link: {os.environ.get('UI_URL', 'https://bytepit.cloud')}/confirm-email/{token}",
+            "subject": outbound_email.subject,
+            "html": outbound_email.html,
+            "plaintext": outbound_email.plaintext,
         },
     }
-    try:
-        poller = client.begin_send(message)
-        # result = poller.result()
-    except Exception as e:
-        print(e)
-        return False
-    return True
+    poller = client.begin_send(message)
+    result = poller.result(timeout=EMAIL_SEND_TIMEOUT)
+    if not poller.done():
+        raise TimeoutError(f"Email delivery did not finish within {EMAIL_SEND_TIMEOUT} seconds")
+    if not result or result.get("status") != "Succeeded":
+        raise RuntimeError((result or {}).get("error") or "Email delivery failed")
+
+
+def get_retry_delay(attempts: int):
+    return min(EMAIL_RETRY_BASE_DELAY * 2 ** (attempts - 1), EMAIL_RETRY_MAX_DELAY)
+
+
+def send_pending_emails():
+    outbound_emails = email_queries.claim_due_emails(EMAIL_BATCH_SIZE)
+    for outbound_email in outbound_emails:
+        try:
+            deliver_email(outbound_email)
+        except Exception as e:
+            print(e)
+            email_queries.set_email_failed(
+                outbound_email.id, str(e), get_retry_delay(outbound_email.attempts), EMAIL_MAX_ATTEMPTS
+            )
+        else:
+            email_queries.set_email_sent(outbound_email.id)
+    return len(outbound_emails)
+
+
+def email_sender():
+    while not email_stop.is_set():
+        email_wakeup.clear()
+        try:
+            if send_pending_emails() == EMAIL_BATCH_SIZE:
+                continue
+        except Exception as e:
+            print(e)
+        email_wakeup.wait(EMAIL_POLL_INTERVAL)
+
+
+def start_email_sender():
+    email_queries.requeue_stale_emails(EMAIL_STALE_AFTER_SECONDS)
+    email_stop.clear()
+    sender = threading.Thread(target=email_sender, name="email-sender", daemon=True)
+    sender.start()
+    email_senders.append(sender)
+
+
+def stop_email_sender():
+    email_stop.set()
+    email_wakeup.set()
+    for sender in email_senders:
+        sender.join(timeout=EMAIL_SEND_TIMEOUT)
+    email_senders.clear()
@@ -0,0 +1,69 @@
+import mimetypes
+import os
+import re
+
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Tuple, Union
+
+
+FILE_CACHE_MAX_AGE = int(os.environ.get("FILE_CACHE_MAX_AGE", 300))
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def quote_etag(etag: str):
+    return etag if etag.startswith('"') else f'"{etag}"'
+
+
+def etag_matches(if_none_match: Union[str, None], etag: str):
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or quote_etag(etag) in [candidate.removeprefix("W/") for candidate in candidates]
+
+
+def parse_range_header(range_header: Union[str, None], size: int) -> Union[Tuple[int, int], None]:
+    if not range_header:
+        return None
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        suffix_length = int(last)
+        if suffix_length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - suffix_length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, (min(int(last), size - 1) if last else size - 1)
+
+
+def get_content_type(file_name: str, stored_content_type: Union[str, None] = None):
+    if stored_content_type and stored_content_type != "application/octet-stream":
+        return stored_content_type
+    content_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+    if content_type.startswith("text/"):
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def format_http_date(value: datetime):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def get_cache_headers(etag: str, last_modified: Union[datetime, None]):
+    headers = {"ETag": quote_etag(etag), "Cache-Control": f"public, max-age={FILE_CACHE_MAX_AGE}"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_http_date(last_modified)
+    return headers
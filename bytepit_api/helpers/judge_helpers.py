@@ -0,0 +1,45 @@
+import queue
+import threading
+import uuid
+
+from typing import Callable
+
+
+submission_queue = queue.Queue()
+judge_workers = []
+
+
+def enqueue_submission(submission_id: uuid.UUID):
+    submission_queue.put(submission_id)
+
+
+def judge_worker(judge: Callable[[uuid.UUID], None]):
+    while True:
+        submission_id = submission_queue.get()
+        try:
+            if submission_id is None:
+                return
+            judge(submission_id)
+        except Exception as e:
+            print(e)
+        finally:
+            submission_queue.task_done()
+
+
+def start_judge_workers(judge: Callable[[uuid.UUID], None], num_workers: int):
+    for i in range(num_workers):
+        worker = threading.Thread(target=judge_worker, args=(judge,), name=f"judge-{i}", daemon=True)
+        worker.start()
+        judge_workers.append(worker)
+
+
+def stop_judge_workers():
+    for _ in judge_workers:
+        submission_queue.put(None)
+    for worker in judge_workers:
+        worker.join(timeout=30)
+    judge_workers.clear()
+
+
+def get_judge_stats():
+    return {"workers": len(judge_workers), "queued": submission_queue.qsize()}
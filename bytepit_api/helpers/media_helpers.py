@@ -0,0 +1,73 @@
+import hashlib
+import os
+import re
+
+from typing import Mapping, Union
+
+from fastapi import HTTPException, Response
+
+from bytepit_api.database import media_queries
+from bytepit_api.helpers import http_helpers
+from bytepit_api.helpers.cache_helpers import LRUCache
+
+
+MEDIA_SHA_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+]
+
+media_cache = LRUCache(max_size=int(os.environ.get("MEDIA_CACHE_SIZE", 256)))
+
+
+def get_media_sha(content: bytes):
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_image_content_type(content: bytes):
+    for signature, content_type in IMAGE_SIGNATURES:
+        if content.startswith(signature):
+            return content_type
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def get_insert_media_query(content: bytes):
+    sha = get_media_sha(content)
+    return sha, media_queries.get_insert_media_query(sha, content, get_image_content_type(content))
+
+
+async def store_media_async(content: Union[bytes, None]):
+    if not content:
+        return None
+    sha = get_media_sha(content)
+    if not await media_queries.insert_media_async(sha, content, get_image_content_type(content)):
+        raise HTTPException(status_code=500, detail="Could not store media")
+    return sha
+
+
+async def get_media(sha: str, request_headers: Union[Mapping[str, str], None] = None):
+    if not MEDIA_SHA_PATTERN.match(sha):
+        raise HTTPException(status_code=404, detail=f"Media {sha} not found")
+    request_headers = request_headers or {}
+    headers = {
+        "ETag": http_helpers.quote_etag(sha),
+        "Cache-Control": MEDIA_CACHE_CONTROL,
+        "X-Content-Type-Options": "nosniff",
+    }
+    if http_helpers.etag_matches(request_headers.get("if-none-match"), sha):
+        return Response(status_code=304, headers=headers)
+    media = media_cache.get(sha)
+    if media is None:
+        media = await media_queries.get_media(sha)
+        if media is None:
+            raise HTTPException(status_code=404, detail=f"Media {sha} not found")
+        media_cache.set(sha, media)
+    media_type = media.content_type or get_image_content_type(media.content)
+    return Response(content=media.content, headers=headers, media_type=media_type)
@@ -0,0 +1,75 @@
+import io
+import json
+import re
+import shutil
+import struct
+import tempfile
+import zlib
+
+from typing import BinaryIO, Dict, Tuple
+
+
+PACK_MAGIC = b"BPTP"
+PACK_VERSION = 1
+PACK_HEADER = struct.Struct(">4sHI")
+PACK_CHUNK_SIZE = 1024 * 1024
+PACK_SPOOL_SIZE = 16 * 1024 * 1024
+
+TEST_FILE_PATTERN = re.compile(r"^(\d+)_(in|out)\.txt$")
+
+
+def write_pack(files: Dict[str, BinaryIO], output: BinaryIO):
+    index = []
+    with tempfile.SpooledTemporaryFile(max_size=PACK_SPOOL_SIZE) as payload:
+        for name in sorted(files):
+            compressor = zlib.compressobj()
+            offset = payload.tell()
+            size = 0
+            while chunk := files[name].read(PACK_CHUNK_SIZE):
+                size += len(chunk)
+                payload.write(compressor.compress(chunk))
+            payload.write(compressor.flush())
+            index.append({"name": name, "offset": offset, "length": payload.tell() - offset, "size": size})
+        index_bytes = json.dumps(index, separators=(",", ":")).encode("utf-8")
+        output.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(index_bytes)))
+        output.write(index_bytes)
+        payload.seek(0)
+        shutil.copyfileobj(payload, output, PACK_CHUNK_SIZE)
+
+
+def pack_files(files: Dict[str, bytes]):
+    output = io.BytesIO()
+    write_pack({name: io.BytesIO(content) for name, content in files.items()}, output)
+    return output.getvalue()
+
+
+def read_pack_index(data: bytes) -> Tuple[list, int]:
+    if len(data) < PACK_HEADER.size:
+        raise ValueError("Test pack is truncated")
+    magic, version, index_length = PACK_HEADER.unpack_from(data)
+    if magic != PACK_MAGIC or version != PACK_VERSION:
+        raise ValueError("Unsupported test pack format")
+    payload_offset = PACK_HEADER.size + index_length
+    index = json.loads(data[PACK_HEADER.size : payload_offset].decode("utf-8"))
+    return index, payload_offset
+
+
+def unpack_files(data: bytes):
+    index, payload_offset = read_pack_index(data)
+    files = {}
+    for entry in index:
+        start = payload_offset + entry["offset"]
+        content = zlib.decompress(data[start : start + entry["length"]])
+        if len(content) != entry["size"]:
+            raise ValueError(f"Test pack entry {entry['name']} is corrupted")
+        files[entry["name"]] = content
+    return files
+
+
+def group_tests(files: Dict[str, str]):
+    tests = {}
+    for name, content in files.items():
+        match = TEST_FILE_PATTERN.match(name.split("/")[-1])
+        if match:
+            tests.setdefault(match.group(1), {})[match.group(2)] = content
+    return tests
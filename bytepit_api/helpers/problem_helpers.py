@@ -5,7 +5,7 @@ from typing import List
 from fastapi import HTTPException, UploadFile, status
 
 from bytepit_api.database import problem_queries
-from bytepit_api.helpers import blob_storage_helpers
+from bytepit_api.helpers import blob_storage_helpers, submission_helpers
 from bytepit_api.models.dtos import ModifyProblemDTO
 
 
@@ -44,8 +44,19 @@ def modify_problem_in_database(problem_id: uuid.UUID, new_problem: ModifyProblem
         )
 
 
+def upload_tests(problem_id: uuid.UUID, test_files: List[UploadFile]):
+    files = {test_file.filename: test_file.file for test_file in test_files}
+    problem_tests = blob_storage_helpers.upload_test_blobs(problem_id, files)
+    for test_file in test_files:
+        test_file.file.seek(0)
+    problem_tests.append(blob_storage_helpers.upload_tests_pack(problem_id, files))
+    if not problem_queries.replace_problem_tests(problem_id, problem_tests):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not save problem test manifest"
+        )
+
+
 def modify_problem_in_blob_storage(problem_id: uuid.UUID, test_files: List[UploadFile]):
     blob_storage_helpers.delete_all_blobs(problem_id)
-    for test_file in test_files:
-        data = test_file.file.read()
-        blob_storage_helpers.upload_blob(f"{problem_id}/{test_file.filename}", data)
+    upload_tests(problem_id, test_files)
+    submission_helpers.invalidate_verdicts(problem_id)
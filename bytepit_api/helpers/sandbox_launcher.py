@@ -0,0 +1,75 @@
+import ctypes
+import json
+import os
+import resource
+import sys
+
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWNET = 0x40000000
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+
+SANDBOX_DIR = "/tmp/sandbox"
+
+libc = ctypes.CDLL(None, use_errno=True)
+
+
+def check(result: int, action: str):
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{action}: {os.strerror(errno)}")
+
+
+def mount(source: str, target: str, fstype, flags: int, data=None):
+    check(
+        libc.mount(
+            source.encode(),
+            target.encode(),
+            fstype.encode() if fstype else None,
+            ctypes.c_ulong(flags),
+            data.encode() if data else None,
+        ),
+        f"mount {target}",
+    )
+
+
+def isolate(work_dir: str, hidden_paths: list):
+    check(libc.unshare(CLONE_NEWNS | CLONE_NEWNET), "unshare")
+    mount("none", "/", None, MS_REC | MS_PRIVATE)
+    work_dir_fd = os.open(work_dir, os.O_RDONLY | os.O_DIRECTORY)
+    for path in hidden_paths:
+        if os.path.isdir(path):
+            mount("tmpfs", path, "tmpfs", MS_NOSUID | MS_NODEV, "size=1m,mode=755")
+    mount("tmpfs", "/tmp", "tmpfs", MS_NOSUID | MS_NODEV, "size=64m,mode=1777")
+    os.mkdir(SANDBOX_DIR)
+    mount(f"/proc/self/fd/{work_dir_fd}", SANDBOX_DIR, None, MS_BIND)
+    os.close(work_dir_fd)
+    return SANDBOX_DIR
+
+
+def main():
+    config = json.loads(sys.argv[1])
+    command = sys.argv[2:]
+    try:
+        work_dir = config["work_dir"]
+        if config["isolate"]:
+            work_dir = isolate(work_dir, config["hidden_paths"])
+        if config["uid"] is not None:
+            os.setgroups([])
+            os.setgid(config["gid"])
+            os.setuid(config["uid"])
+        os.chdir(work_dir)
+        for name, soft_limit, hard_limit in config["limits"]:
+            resource.setrlimit(getattr(resource, name), (soft_limit, hard_limit))
+        os.execvpe(command[0], command, config["env"])
+    except OSError as e:
+        sys.stderr.write(f"Sandbox setup failed: {e}\n")
+        os._exit(126)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,70 @@
+import hashlib
+import json
 import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
 import requests
 
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import Callable, List, Union
+
+from bytepit_api.helpers.cache_helpers import LRUCache
 from bytepit_api.models.dtos import Language
 
 
-def evaluate_problem_submission(source_code: str, test_input: str, language: str):
+EVALUATION_TIMEOUT = float(os.environ.get("SUBMISSION_EVALUATION_TIMEOUT", 30))
+
+evaluation_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("SUBMISSION_EVALUATION_CONCURRENCY", 8)),
+    thread_name_prefix="evaluation",
+)
+
+verdict_cache = LRUCache(max_size=int(os.environ.get("VERDICT_CACHE_SIZE", 1024)))
+
+COMPILE_OUTPUT_LIMIT = 64 * 1024 * 1024
+
+SANDBOX_LAUNCHER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_launcher.py")
+SANDBOX_PATH = "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LOCAL_LANGUAGES = {
+    Language.python: {"file_name": "main.py", "compile": None, "run": ["python3", "main.py"]},
+    Language.c: {"file_name": "main.c", "compile": ["gcc", "-O2", "-o", "main", "main.c", "-lm"], "run": ["./main"]},
+    Language.cpp: {"file_name": "main.cpp", "compile": ["g++", "-O2", "-o", "main", "main.cpp"], "run": ["./main"]},
+    Language.node: {"file_name": "main.js", "compile": None, "run": ["node", "main.js"]},
+    Language.javascript: {"file_name": "main.js", "compile": None, "run": ["node", "main.js"]},
+    Language.java: {"file_name": "Main.java", "compile": ["javac", "Main.java"], "run": ["java", "-cp", ".", "Main"]},
+}
+
+
+class Evaluator(ABC):
+    def compile(self, source_code: str, language: str):
+        return {"source_code": source_code, "language": language}
+
+    @abstractmethod
+    def run(self, artifact: dict, test_input: str):
+        pass
+
+    def cleanup(self, artifact: dict):
+        pass
+
+    def evaluate(self, source_code: str, test_input: str, language: str):
+        artifact = self.compile(source_code, language)
+        try:
+            return self.run(artifact, test_input)
+        finally:
+            self.cleanup(artifact)
+
+
+class OneCompilerEvaluator(Evaluator):
     languages = {
         Language.python: "main.py",
         Language.c: "main.c",
@@ -13,17 +73,260 @@ def evaluate_problem_submission(source_code: str, test_input: str, language: str
         Language.javascript: "main.js",
         Language.java: "Main.java",
     }
-    evaluator_api_url = "https://onecompiler-apis.p.rapidapi.com/api/v1/run"
-    headers = {
-        "content-type": "application/json",
-        "X-RapidAPI-Key": os.environ.get("RAPID_API_KEY"),
-        "X-RapidAPI-Host": "onecompiler-apis.p.rapidapi.com",
-    }
-    payload = {
-        "language": language,
-        "stdin": test_input,
-        "files": [{"name": languages[language], "content": source_code}],
-    }
-    response = requests.post(evaluator_api_url, headers=headers, json=payload)
-    response_json = response.json()
-    return response_json
+
+    def run(self, artifact: dict, test_input: str):
+        evaluator_api_url = "https://onecompiler-apis.p.rapidapi.com/api/v1/run"
+        headers = {
+            "content-type": "application/json",
+            "X-RapidAPI-Key": os.environ.get("RAPID_API_KEY"),
+            "X-RapidAPI-Host": "onecompiler-apis.p.rapidapi.com",
+        }
+        payload = {
+            "language": artifact["language"],
+            "stdin": test_input,
+            "files": [{"name": self.languages[artifact["language"]], "content": artifact["source_code"]}],
+        }
+        try:
+            response = requests.post(evaluator_api_url, headers=headers, json=payload, timeout=EVALUATION_TIMEOUT)
+        except requests.Timeout:
+            return {"stdout": None, "stderr": None, "executionTime": EVALUATION_TIMEOUT * 1000, "exception": None}
+        response_json = response.json()
+        return response_json
+
+
+class LocalEvaluator(Evaluator):
+    def __init__(
+        self,
+        cpu_time_limit: int = 5,
+        memory_limit: int = 256,
+        output_limit: int = 1024 * 1024,
+        compile_time_limit: int = 30,
+        process_limit: int = 256,
+        isolate: bool = True,
+        uid: Union[int, None] = None,
+        gid: Union[int, None] = None,
+        hidden_paths: Union[List[str], None] = None,
+        allow_unsafe: bool = False,
+    ):
+        is_root = os.geteuid() == 0
+        uid = uid if uid is not None or not is_root else 65534
+        if not allow_unsafe and not (is_root and isolate and uid not in (None, 0)):
+            raise ValueError(
+                "LocalEvaluator must run as root to isolate submissions under a separate uid; "
+                "set LOCAL_EVALUATOR_ALLOW_UNSAFE=true to run them without a sandbox"
+            )
+        self.cpu_time_limit = cpu_time_limit
+        self.memory_limit = memory_limit * 1024 * 1024
+        self.output_limit = output_limit
+        self.compile_time_limit = compile_time_limit
+        self.process_limit = process_limit
+        self.isolate = isolate and is_root
+        self.uid = uid
+        self.gid = gid if gid is not None else self.uid
+        self.hidden_paths = hidden_paths if hidden_paths is not None else ["/root", "/home", "/srv", APP_ROOT]
+
+    def compile(self, source_code: str, language: str):
+        work_dir = tempfile.mkdtemp(prefix="bytepit-")
+        artifact = {"language": language, "work_dir": work_dir, "compile_result": None}
+        language_config = LOCAL_LANGUAGES[language]
+        with open(os.path.join(work_dir, language_config["file_name"]), "w", encoding="utf-8") as source_file:
+            source_file.write(source_code)
+        if self.uid is not None:
+            os.chown(work_dir, self.uid, self.gid)
+        if language_config["compile"]:
+            compile_result = self.run_process(
+                language_config["compile"], work_dir, "", self.compile_time_limit, None, COMPILE_OUTPUT_LIMIT
+            )
+            if compile_result["return_code"] != 0:
+                compile_result["exception"] = compile_result["stderr"] or "Compilation failed"
+                artifact["compile_result"] = {**compile_result, "stdout": None}
+        return artifact
+
+    def run(self, artifact: dict, test_input: str):
+        if artifact["compile_result"] is not None:
+            return dict(artifact["compile_result"])
+        return self.run_program(artifact["language"], artifact["work_dir"], test_input)
+
+    def cleanup(self, artifact: dict):
+        shutil.rmtree(artifact["work_dir"], ignore_errors=True)
+
+    def run_program(self, language: str, work_dir: str, test_input: str):
+        command = list(LOCAL_LANGUAGES[language]["run"])
+        memory_limit = self.memory_limit
+        if language == Language.java:
+            command.insert(1, f"-Xmx{self.memory_limit // (1024 * 1024)}m")
+            memory_limit = None
+        elif language in (Language.node, Language.javascript):
+            command.insert(1, f"--max-old-space-size={self.memory_limit // (1024 * 1024)}")
+            memory_limit = None
+        result = self.run_process(command, work_dir, test_input, self.cpu_time_limit, memory_limit, self.output_limit)
+        if result["exception"] is None and result["stdout"] is not None and result["return_code"] != 0:
+            result["exception"] = result["stderr"] or f"Process exited with code {result['return_code']}"
+        return result
+
+    def run_process(
+        self,
+        command: List[str],
+        work_dir: str,
+        test_input: str,
+        cpu_time_limit: int,
+        memory_limit: Union[int, None],
+        output_limit: int,
+    ):
+        limits = [
+            ("RLIMIT_CPU", cpu_time_limit, cpu_time_limit + 1),
+            ("RLIMIT_FSIZE", output_limit, output_limit),
+            ("RLIMIT_NPROC", self.process_limit, self.process_limit),
+        ]
+        if memory_limit is not None:
+            limits.append(("RLIMIT_AS", memory_limit, memory_limit))
+        env = {"PATH": SANDBOX_PATH, "HOME": "/tmp", "LANG": "C.UTF-8"}
+        sandbox_config = {
+            "work_dir": work_dir,
+            "isolate": self.isolate,
+            "hidden_paths": self.hidden_paths,
+            "uid": self.uid,
+            "gid": self.gid,
+            "limits": limits,
+            "env": env,
+        }
+
+        with tempfile.TemporaryFile(dir=work_dir) as stdout_file, tempfile.TemporaryFile(dir=work_dir) as stderr_file:
+            start_time = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, "-I", SANDBOX_LAUNCHER, json.dumps(sandbox_config), *command],
+                cwd=work_dir,
+                env=env,
+                stdin=subprocess.PIPE,
+                stdout=stdout_file,
+                stderr=stderr_file,
+                start_new_session=True,
+            )
+            try:
+                process.communicate(test_input.encode("utf-8"), timeout=cpu_time_limit * 2)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+            except BrokenPipeError:
+                process.wait()
+            execution_time = (time.perf_counter() - start_time) * 1000
+
+            output_size = os.fstat(stdout_file.fileno()).st_size
+            stdout_file.seek(0)
+            stderr_file.seek(0)
+            stdout = stdout_file.read(output_limit).decode("utf-8", errors="replace")
+            stderr = stderr_file.read(output_limit).decode("utf-8", errors="replace")
+
+        result = {
+            "stdout": stdout,
+            "stderr": stderr,
+            "executionTime": execution_time,
+            "exception": None,
+            "return_code": process.returncode,
+        }
+        if process.returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+            result.update({"stdout": None, "executionTime": max(execution_time, cpu_time_limit * 1000)})
+        elif process.returncode == -signal.SIGXFSZ or output_size >= output_limit:
+            result["exception"] = "Output limit exceeded"
+        return result
+
+
+def get_evaluator(backend: str):
+    if backend == "local":
+        return LocalEvaluator(
+            cpu_time_limit=int(os.environ.get("LOCAL_EVALUATOR_CPU_TIME_LIMIT", 5)),
+            memory_limit=int(os.environ.get("LOCAL_EVALUATOR_MEMORY_LIMIT", 256)),
+            output_limit=int(os.environ.get("LOCAL_EVALUATOR_OUTPUT_LIMIT", 1024 * 1024)),
+            process_limit=int(os.environ.get("LOCAL_EVALUATOR_PROCESS_LIMIT", 256)),
+            isolate=os.environ.get("LOCAL_EVALUATOR_ISOLATE", "true").lower() == "true",
+            uid=int(os.environ["LOCAL_EVALUATOR_UID"]) if "LOCAL_EVALUATOR_UID" in os.environ else None,
+            allow_unsafe=os.environ.get("LOCAL_EVALUATOR_ALLOW_UNSAFE", "false").lower() == "true",
+        )
+    return OneCompilerEvaluator()
+
+
+evaluator = get_evaluator(os.environ.get("EVALUATOR_BACKEND", "onecompiler"))
+
+
+artifacts = {}
+artifacts_lock = threading.Lock()
+
+
+def get_artifact_key(source_code: str, language: str):
+    return hashlib.sha256(f"{language}\0{source_code}".encode("utf-8")).hexdigest()
+
+
+def acquire_artifact(source_code: str, language: str):
+    key = get_artifact_key(source_code, language)
+    with artifacts_lock:
+        entry = artifacts.setdefault(key, {"artifact": None, "references": 0, "lock": threading.Lock()})
+        entry["references"] += 1
+    try:
+        with entry["lock"]:
+            if entry["artifact"] is None:
+                entry["artifact"] = evaluator.compile(source_code, language)
+    except Exception:
+        release_artifact(key)
+        raise
+    return key, entry["artifact"]
+
+
+def release_artifact(key: str):
+    with artifacts_lock:
+        entry = artifacts[key]
+        entry["references"] -= 1
+        if entry["references"] > 0:
+            return
+        del artifacts[key]
+    if entry["artifact"] is not None:
+        evaluator.cleanup(entry["artifact"])
+
+
+def get_artifact_stats():
+    with artifacts_lock:
+        return {"artifacts": len(artifacts), "references": sum(entry["references"] for entry in artifacts.values())}
+
+
+def get_verdict_key(problem_id: uuid.UUID, tests_version: str, language: str, source_code: str):
+    return (str(problem_id), tests_version, language, hashlib.sha256(source_code.encode("utf-8")).hexdigest())
+
+
+def is_cacheable_verdict(results: List[Union[dict, None]]):
+    return all(result["stdout"] is not None and not result["exception"] for result in results if result is not None)
+
+
+def invalidate_verdicts(problem_id: uuid.UUID):
+    verdict_cache.invalidate_where(lambda key, _: key[0] == str(problem_id))
+
+
+def evaluate_problem_submission(source_code: str, test_input: str, language: str):
+    return evaluator.evaluate(source_code, test_input, language)
+
+
+def evaluate_problem_submission_tests(
+    source_code: str,
+    test_inputs: List[str],
+    language: str,
+    on_test_done: Union[Callable[[], None], None] = None,
+    is_failed: Union[Callable[[int, dict], bool], None] = None,
+):
+    key, artifact = acquire_artifact(source_code, language)
+    futures = []
+    try:
+        futures = [evaluation_executor.submit(evaluator.run, artifact, test_input) for test_input in test_inputs]
+        if on_test_done:
+            for future in futures:
+                future.add_done_callback(lambda future: future.cancelled() or on_test_done())
+        if is_failed:
+            test_indexes = {future: test_idx for test_idx, future in enumerate(futures)}
+            for future in as_completed(futures):
+                if is_failed(test_indexes[future], future.result()):
+                    for pending_future in futures:
+                        pending_future.cancel()
+                    break
+        return [None if future.cancelled() else future.result() for future in futures]
+    finally:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        release_artifact(key)
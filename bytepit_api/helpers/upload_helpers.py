@@ -0,0 +1,56 @@
+import hashlib
+import os
+
+from typing import BinaryIO
+
+from fastapi import HTTPException, UploadFile, status
+
+
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+MAX_TEST_FILE_SIZE = int(os.environ.get("MAX_TEST_FILE_SIZE", 64 * 1024 * 1024))
+MAX_IMAGE_SIZE = int(os.environ.get("MAX_IMAGE_SIZE", 5 * 1024 * 1024))
+
+
+def raise_too_large(max_size: int):
+    raise HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=f"Uploaded file is larger than {max_size} bytes"
+    )
+
+
+class HashingReader:
+    def __init__(self, file: BinaryIO, max_size: int):
+        self.file = file
+        self.max_size = max_size
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1):
+        if size is None or size < 0:
+            return b"".join(iter(lambda: self.read(UPLOAD_CHUNK_SIZE), b""))
+        chunk = self.file.read(size)
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise_too_large(self.max_size)
+        self.sha256.update(chunk)
+        return chunk
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+
+def read_upload(upload: UploadFile, max_size: int = MAX_IMAGE_SIZE):
+    data = bytearray()
+    while chunk := upload.file.read(UPLOAD_CHUNK_SIZE):
+        data += chunk
+        if len(data) > max_size:
+            raise_too_large(max_size)
+    return bytes(data)
+
+
+async def read_upload_async(upload: UploadFile, max_size: int = MAX_IMAGE_SIZE):
+    data = bytearray()
+    while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+        data += chunk
+        if len(data) > max_size:
+            raise_too_large(max_size)
+    return bytes(data)
@@ -1,12 +1,11 @@
-import base64
 import uuid
 
 from datetime import datetime
 from typing import List, Union
 
-from pydantic import BaseModel, field_serializer, field_validator
+from pydantic import BaseModel, field_validator
 
-from bytepit_api.models.enums import Language, Role
+from bytepit_api.models.enums import EmailStatus, JudgingPolicy, Language, Role, SubmissionStatus
 
 
 class User(BaseModel):
@@ -19,14 +18,8 @@ class User(BaseModel):
     surname: str
     is_verified: bool
     approved_by_admin: bool
-    image: Union[bytes, None] = None
-
-    @field_serializer("image")
-    @classmethod
-    def serialize_image(cls, image):
-        if image:
-            encoded_file_content = base64.b64encode(image).decode("utf-8")
-            return encoded_file_content
+    image_sha: Union[str, None] = None
+    token_epoch: int = 0
 
 
 class Problem(BaseModel):
@@ -59,6 +52,7 @@ class Competition(BaseModel):
     parent_id: Union[uuid.UUID, None] = None
     organiser_id: uuid.UUID
     problems: List[uuid.UUID]
+    judging_policy: JudgingPolicy = JudgingPolicy.full
 
 
 class Trophy(BaseModel):
@@ -66,7 +60,7 @@ class Trophy(BaseModel):
     competition_id: uuid.UUID
     position: int
     user_id: Union[uuid.UUID, None] = None
-    icon: Union[bytes, None] = None
+    icon_sha: Union[str, None] = None
 
 
 class ProblemResult(BaseModel):
@@ -79,3 +73,48 @@ class ProblemResult(BaseModel):
     num_of_points: float
     source_code: str
     language: Language
+
+
+class ProblemTest(BaseModel):
+    problem_id: uuid.UUID
+    blob_name: str
+    test_index: Union[int, None] = None
+    kind: str
+    size: int
+    etag: str
+    content_hash: str
+
+
+class Submission(BaseModel):
+    id: uuid.UUID
+    user_id: uuid.UUID
+    problem_id: uuid.UUID
+    competition_id: Union[uuid.UUID, None] = None
+    source_code: str
+    language: Language
+    judging_policy: JudgingPolicy = JudgingPolicy.full
+    status: SubmissionStatus
+    tests_total: int
+    tests_done: int
+    result: Union[dict, None] = None
+    created_on: datetime
+
+
+class OutboundEmail(BaseModel):
+    id: uuid.UUID
+    recipient: str
+    subject: str
+    html: str
+    plaintext: str
+    status: EmailStatus
+    attempts: int
+    last_error: Union[str, None] = None
+    next_attempt_at: datetime
+    created_on: datetime
+    updated_on: datetime
+
+
+class Media(BaseModel):
+    sha: str
+    content: bytes
+    content_type: Union[str, None] = None
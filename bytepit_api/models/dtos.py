@@ -1,4 +1,3 @@
-import base64
 import uuid
 from datetime import datetime
 
@@ -6,11 +5,11 @@ from datetime import datetime
 from typing import Annotated, List, Union
 
 from fastapi import Form, File, UploadFile
-from pydantic import BaseModel, EmailStr, field_validator, field_serializer, model_validator
+from pydantic import BaseModel, EmailStr, computed_field, field_validator, model_validator
 from pydantic_core import PydanticCustomError
 
-from bytepit_api.models.shared import as_form
-from bytepit_api.models.enums import Language, RegisterRole, Role
+from bytepit_api.models.shared import as_form, get_media_url
+from bytepit_api.models.enums import JudgingPolicy, Language, RegisterRole, Role, SubmissionStatus
 
 
 @as_form
@@ -57,14 +56,12 @@ class UserDTO(BaseModel):
     surname: str
     is_verified: bool
     approved_by_admin: bool
-    image: Union[bytes, None] = None
+    image_sha: Union[str, None] = None
 
-    @field_serializer("image")
-    @classmethod
-    def serialize_image(cls, image):
-        if image:
-            encoded_file_content = base64.b64encode(image).decode("utf-8")
-            return encoded_file_content
+    @computed_field
+    @property
+    def image_url(self) -> Union[str, None]:
+        return get_media_url(self.image_sha)
 
 
 class TokenDTO(BaseModel):
@@ -138,14 +135,12 @@ class TrophyDTO(BaseModel):
     competition_id: Union[uuid.UUID, None] = None
     user_id: Union[uuid.UUID, None] = None
     position: int
-    icon: Union[bytes, None] = None
+    icon_sha: Union[str, None] = None
 
-    @field_serializer("icon")
-    @classmethod
-    def serialize_icon(cls, icon):
-        if icon:
-            encoded_file_content = base64.b64encode(icon).decode("utf-8")
-            return encoded_file_content
+    @computed_field
+    @property
+    def icon_url(self) -> Union[str, None]:
+        return get_media_url(self.icon_sha)
 
 
 class CompetitionDTO(BaseModel):
@@ -157,6 +152,7 @@ class CompetitionDTO(BaseModel):
     parent_id: Union[uuid.UUID, None] = None
     organiser_id: Union[uuid.UUID, None] = None
     organiser_username: Union[str, None] = None
+    judging_policy: JudgingPolicy = JudgingPolicy.full
     problems: Union[List[ProblemDTO], None] = []
     trophies: Union[List[TrophyDTO], None] = []
 
@@ -169,6 +165,7 @@ class CreateCompetitionDTO(BaseModel):
     end_time: Annotated[str, Form()]
     parent_id: Annotated[Union[uuid.UUID, None], Form()] = None
     problems: Annotated[List[uuid.UUID], Form()]
+    judging_policy: Annotated[JudgingPolicy, Form()] = JudgingPolicy.full
     first_place_trophy: Annotated[Union[UploadFile, None], File()] = None
     second_place_trophy: Annotated[Union[UploadFile, None], File()] = None
     third_place_trophy: Annotated[Union[UploadFile, None], File()] = None
@@ -188,6 +185,7 @@ class ModifyCompetitionDTO(BaseModel):
     end_time: Annotated[Union[str, None], Form()] = None
     parent_id: Annotated[Union[uuid.UUID, None], Form()] = None
     problems: Annotated[List[uuid.UUID], Form()] = []
+    judging_policy: Annotated[Union[JudgingPolicy, None], Form()] = None
     first_place_trophy: Annotated[Union[UploadFile, None], File()] = None
     second_place_trophy: Annotated[Union[UploadFile, None], File()] = None
     third_place_trophy: Annotated[Union[UploadFile, None], File()] = None
@@ -224,6 +222,7 @@ class CompetitionResultDTO(BaseModel):
     user_id: uuid.UUID
     username: str
     total_points: float
+    total_runtime: float = 0
     rank_in_competition: int
     problem_results: List[ProblemResultDTO]
 
@@ -237,18 +236,26 @@ class ProblemResultStatusDTO(BaseModel):
     exception: Union[str, None] = None
 
 
+class SubmissionDTO(BaseModel):
+    id: uuid.UUID
+    problem_id: uuid.UUID
+    competition_id: Union[uuid.UUID, None] = None
+    status: SubmissionStatus
+    tests_total: int = 0
+    tests_done: int = 0
+    result: Union[ProblemResultStatusDTO, None] = None
+
+
 class TrophiesByUserDTO(BaseModel):
     competition_id: uuid.UUID
     competition_name: str
     rank_in_competition: int
-    icon: Union[bytes, None] = None
+    icon_sha: Union[str, None] = None
 
-    @field_serializer("icon")
-    @classmethod
-    def serialize_icon(cls, icon):
-        if icon:
-            encoded_file_content = base64.b64encode(icon).decode("utf-8")
-            return encoded_file_content
+    @computed_field
+    @property
+    def icon_url(self) -> Union[str, None]:
+        return get_media_url(self.icon_sha)
 
 
 class UserStatisticsDTO(BaseModel):
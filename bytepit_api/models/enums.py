@@ -19,3 +19,21 @@ class Language(str, Enum):
     node = "nodejs"
     javascript = "javascript"
     java = "java"
+
+
+class JudgingPolicy(str, Enum):
+    full = "full"
+    fail_fast = "fail_fast"
+
+
+class SubmissionStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+
+
+class EmailStatus(str, Enum):
+    pending = "pending"
+    sending = "sending"
+    sent = "sent"
+    failed = "failed"
@@ -1,10 +1,13 @@
 import inspect
+import uuid
 
 from typing import Annotated, Union
 
 from fastapi import Form
 from pydantic import BaseModel
 
+from bytepit_api.models.enums import Role
+
 
 def as_form(cls):
     new_params = [
@@ -22,5 +25,21 @@ def as_form(cls):
     return cls
 
 
+MEDIA_URL_PREFIX = "/api/media"
+
+
+def get_media_url(sha: Union[str, None]):
+    return f"{MEDIA_URL_PREFIX}/{sha}" if sha else None
+
+
 class TokenData(BaseModel):
     email: Union[str, None] = None
+
+
+class Principal(BaseModel):
+    id: uuid.UUID
+    email: str
+    role: Role
+    is_verified: bool
+    approved_by_admin: bool
+    token_epoch: int
@@ -1,10 +1,11 @@
-from typing import Annotated, List
+from typing import Annotated, List, Union
 from fastapi import APIRouter, Depends
 
 from bytepit_api.services import admin_service
 
 from bytepit_api.dependencies.auth_dependencies import get_current_admin_user
 from bytepit_api.models.db_models import User
+from bytepit_api.models.shared import Principal
 from bytepit_api.models.dtos import UserDTO
 from bytepit_api.models.enums import Role
 
@@ -13,17 +14,19 @@ router = APIRouter(prefix="/admin", tags=["admin"])
 
 
 @router.get("/list-users", response_model=List[UserDTO])
-def list_users(current_admin_user: Annotated[User, Depends(get_current_admin_user)]):
+def list_users(current_admin_user: Annotated[Union[User, Principal], Depends(get_current_admin_user)]):
     return admin_service.get_users()
 
 
 @router.get("/unapproved-organisers", response_model=List[UserDTO])
-def list_unapproved_organisers(current_admin_user: Annotated[User, Depends(get_current_admin_user)]):
+def list_unapproved_organisers(current_admin_user: Annotated[Union[User, Principal], Depends(get_current_admin_user)]):
     return admin_service.get_unapproved_organisers()
 
 
 @router.post("/confirm-organiser/{username}")
-def confirm_organiser(username: str, current_admin_user: Annotated[User, Depends(get_current_admin_user)]):
+def confirm_organiser(
+    username: str, current_admin_user: Annotated[Union[User, Principal], Depends(get_current_admin_user)]
+):
     return admin_service.set_approved_organiser(username)
 
 
@@ -31,6 +34,26 @@ def confirm_organiser(username: str, current_admin_user: Annotated[User, Depends
 def change_role(
     username: str,
     new_role: Annotated[Role, "new_role"],
-    current_admin_user: Annotated[User, Depends(get_current_admin_user)],
+    current_admin_user: Annotated[Union[User, Principal], Depends(get_current_admin_user)],
 ):
     return admin_service.set_user_role(username, new_role)
+
+
+@router.get("/database-stats")
+def get_database_stats(current_admin_user: Annotated[Union[User, Principal], Depends(get_current_admin_user)]):
+    return admin_service.get_database_stats()
+
+
+@router.get("/password-hashing-stats")
+def get_password_hashing_stats(current_admin_user: Annotated[Union[User, Principal], Depends(get_current_admin_user)]):
+    return admin_service.get_password_hashing_stats()
+
+
+@router.get("/judge-stats")
+def get_judge_stats(current_admin_user: Annotated[Union[User, Principal], Depends(get_current_admin_user)]):
+    return admin_service.get_judge_stats()
+
+
+@router.get("/artifact-stats")
+def get_artifact_stats(current_admin_user: Annotated[Union[User, Principal], Depends(get_current_admin_user)]):
+    return admin_service.get_artifact_stats()
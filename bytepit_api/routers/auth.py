@@ -1,4 +1,4 @@
-from typing import Annotated
+from typing import Annotated, Union
 import uuid
 
 from fastapi import APIRouter, Depends, Response
@@ -6,6 +6,7 @@ from fastapi import APIRouter, Depends, Response
 from bytepit_api.services import auth_service
 from bytepit_api.dependencies.auth_dependencies import get_current_verified_user
 from bytepit_api.models.db_models import User
+from bytepit_api.models.shared import Principal
 from bytepit_api.models.dtos import LoginDTO, RegisterDTO, TokenDTO, UserDTO
 
 
@@ -23,8 +24,8 @@ def confirm_email(verification_token: str):
 
 
 @router.post("/login", response_model=TokenDTO)
-def login(response: Response, form_data: Annotated[LoginDTO, Depends()]):
-    return auth_service.login(form_data, response)
+async def login(response: Response, form_data: Annotated[LoginDTO, Depends()]):
+    return await auth_service.login(form_data, response)
 
 
 @router.post("/logout")
@@ -33,10 +34,10 @@ def logout(response: Response):
 
 
 @router.get("/current", response_model=UserDTO)
-def get_current_user(current_user: Annotated[User, Depends(get_current_verified_user)]):
-    return current_user
+async def get_current_user(current_user: Annotated[Union[User, Principal], Depends(get_current_verified_user)]):
+    return await auth_service.get_current_user(current_user)
 
 
 @router.get("/{username}", response_model=UserDTO)
-def get_user(username: str, current_user: Annotated[User, Depends(get_current_verified_user)]):
+def get_user(username: str, current_user: Annotated[Union[User, Principal], Depends(get_current_verified_user)]):
     return auth_service.get_user(username)
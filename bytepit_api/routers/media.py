@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Request
+
+from bytepit_api.helpers import media_helpers
+
+
+router = APIRouter(prefix="/media", tags=["media"])
+
+
+@router.get("/{sha}")
+async def get_media(sha: str, request: Request):
+    return await media_helpers.get_media(sha, request.headers)
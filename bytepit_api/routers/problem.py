@@ -1,8 +1,8 @@
 import uuid
 
-from typing import Annotated, List
+from typing import Annotated, List, Union
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 
 from bytepit_api.dependencies.auth_dependencies import (
     get_current_approved_organiser,
@@ -14,10 +14,11 @@ from bytepit_api.models.dtos import (
     ProblemDTO,
     CreateProblemDTO,
     ModifyProblemDTO,
-    ProblemResultStatusDTO,
+    SubmissionDTO,
     UserStatisticsDTO,
 )
 from bytepit_api.models.db_models import User
+from bytepit_api.models.shared import Principal
 from bytepit_api.services import problem_service
 
 
@@ -30,19 +31,21 @@ def list_problems():
 
 
 @router.get("/user-statistics/{user_id}", response_model=UserStatisticsDTO)
-def get_user_statistics(user_id: uuid.UUID, current_user: Annotated[User, Depends(get_current_verified_user)]):
-    return problem_service.get_user_statistics(user_id)
+async def get_user_statistics(
+    user_id: uuid.UUID, current_user: Annotated[Union[User, Principal], Depends(get_current_verified_user)]
+):
+    return await problem_service.get_user_statistics(user_id)
 
 
 @router.get("/problems-by-organiser/{organiser_id}", response_model=List[ProblemDTO])
 def get_problems_by_organiser(
-    organiser_id: uuid.UUID, current_user: Annotated[User, Depends(get_current_verified_user)]
+    organiser_id: uuid.UUID, current_user: Annotated[Union[User, Principal], Depends(get_current_verified_user)]
 ):
     return problem_service.get_problems_by_organiser(organiser_id)
 
 
 @router.get("/available", response_model=List[ProblemDTO])
-def get_available_problems(current_user: Annotated[User, Depends(get_current_verified_user)]):
+def get_available_problems(current_user: Annotated[Union[User, Principal], Depends(get_current_verified_user)]):
     return problem_service.get_available_problems()
 
 
@@ -54,7 +57,7 @@ def get_problem(problem_id: uuid.UUID):
 @router.post("")
 def create_problem(
     form_data: Annotated[CreateProblemDTO, Depends()],
-    current_user: Annotated[User, Depends(get_current_approved_organiser)],
+    current_user: Annotated[Union[User, Principal], Depends(get_current_approved_organiser)],
 ):
     return problem_service.create_problem(form_data, current_user.id)
 
@@ -63,26 +66,37 @@ def create_problem(
 def modify_problem(
     problem_id: uuid.UUID,
     form_data: Annotated[ModifyProblemDTO, Depends()],
-    current_user: Annotated[User, Depends(get_current_approved_organiser)],
+    current_user: Annotated[Union[User, Principal], Depends(get_current_approved_organiser)],
 ):
     return problem_service.modify_problem(problem_id, form_data)
 
 
 @router.delete("/{problem_id}")
-def delete_problem(problem_id: uuid.UUID, current_user: Annotated[User, Depends(get_current_approved_organiser)]):
+def delete_problem(
+    problem_id: uuid.UUID, current_user: Annotated[Union[User, Principal], Depends(get_current_approved_organiser)]
+):
     return problem_service.delete_problem(problem_id)
 
 
-@router.post("/create-submission", response_model=ProblemResultStatusDTO)
-def create_submission(
-    current_user: Annotated[User, Depends(get_current_verified_user)],
+@router.post("/create-submission", response_model=SubmissionDTO)
+async def create_submission(
+    current_user: Annotated[Union[User, Principal], Depends(get_current_verified_user)],
     form_data: Annotated[CreateSubmissionDTO, Depends()],
 ):
-    return problem_service.create_submission(current_user.id, form_data)
+    return await problem_service.create_submission(current_user.id, form_data)
+
+
+@router.get("/submissions/{submission_id}", response_model=SubmissionDTO)
+def get_submission_status(
+    submission_id: uuid.UUID, current_user: Annotated[Union[User, Principal], Depends(get_current_verified_user)]
+):
+    return problem_service.get_submission_status(submission_id, current_user.id)
 
 
 @router.get("/submission/{problem_id}")
-def get_submission(problem_id: uuid.UUID, current_user: Annotated[User, Depends(get_current_verified_user)]):
+def get_submission(
+    problem_id: uuid.UUID, current_user: Annotated[Union[User, Principal], Depends(get_current_verified_user)]
+):
     return problem_service.get_submission(problem_id, current_user.id)
 
 
@@ -90,11 +104,11 @@ def get_submission(problem_id: uuid.UUID, current_user: Annotated[User, Depends(
 def get_submission_on_competition(
     problem_id: uuid.UUID,
     competition_id: uuid.UUID,
-    current_user: Annotated[User, Depends(get_current_verified_user)],
+    current_user: Annotated[Union[User, Principal], Depends(get_current_verified_user)],
 ):
     return problem_service.get_submission_on_competition(problem_id, current_user.id, competition_id)
 
 
 @router.get("/{problem_id}/{file_name}")
-def get_file(problem_id: uuid.UUID, file_name: str):
-    return blob_storage_helpers.get_blob(f"{problem_id}/{file_name}")
+async def get_file(problem_id: uuid.UUID, file_name: str, request: Request):
+    return await blob_storage_helpers.get_blob_async(f"{problem_id}/{file_name}", request.headers)
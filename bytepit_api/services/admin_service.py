@@ -2,6 +2,9 @@ from fastapi import HTTPException, status
 
 import bytepit_api.database.admin_queries as admin_queries
 
+from bytepit_api.database import async_db, db
+from bytepit_api.helpers import auth_helpers, judge_helpers, submission_helpers
+
 from bytepit_api.models.enums import Role
 
 
@@ -23,6 +26,7 @@ def set_approved_organiser(username: str):
     result = admin_queries.set_approved_organiser(username)
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with {username} not found")
+    auth_helpers.invalidate_principal(username=username)
     return {"detail": f"Organiser {username} is now approved"}
 
 
@@ -30,4 +34,21 @@ def set_user_role(username: str, new_role: Role):
     result = admin_queries.set_user_role(username, new_role)
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with {username} not found")
+    auth_helpers.invalidate_principal(username=username)
     return {"detail": f"Role successfully changed to {new_role} for user {username}"}
+
+
+def get_password_hashing_stats():
+    return auth_helpers.get_password_hashing_stats()
+
+
+def get_database_stats():
+    return {"sync_pool": db.get_stats(), "async_pool": async_db.get_stats()}
+
+
+def get_judge_stats():
+    return judge_helpers.get_judge_stats()
+
+
+def get_artifact_stats():
+    return submission_helpers.get_artifact_stats()
@@ -1,26 +1,34 @@
 from datetime import timedelta, datetime
+from typing import Union
 from urllib.parse import quote
 import uuid
 
 from fastapi import HTTPException, status, Response
+from fastapi.concurrency import run_in_threadpool
 
 from bytepit_api.database import auth_queries
 from bytepit_api.helpers import auth_helpers, email_helpers
+from bytepit_api.models.db_models import User
 from bytepit_api.models.dtos import LoginDTO, RegisterDTO
+from bytepit_api.models.shared import Principal
 
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 
 async def register(form_data: RegisterDTO):
-    if auth_queries.get_user_by_email(form_data.email) or auth_queries.get_user_by_username(form_data.username):
+    if await run_in_threadpool(auth_queries.get_user_by_email, form_data.email) or await run_in_threadpool(
+        auth_queries.get_user_by_username, form_data.username
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email or username already in use",
         )
     confirmation_token = auth_helpers.generate_confirmation_token()
-    password_hash = auth_helpers.get_password_hash(form_data.password)
-    result = auth_queries.create_user(
+    password_hash = await auth_helpers.get_password_hash_async(form_data.password)
+    verification_email = email_helpers.render_verification_email(form_data.email, confirmation_token)
+    result = await run_in_threadpool(
+        auth_queries.create_user,
         form_data.username,
         password_hash,
         form_data.name,
@@ -29,18 +37,19 @@ async def register(form_data: RegisterDTO):
         form_data.role,
         confirmation_token,
         form_data.image,
+        verification_email,
     )
     if not result or not confirmation_token:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Something went wrong. Please try again.",
         )
-    await email_helpers.send_verification_email(form_data.email, confirmation_token)
+    email_helpers.wake_email_sender()
     return Response(status_code=status.HTTP_201_CREATED)
 
 
-def login(form_data: LoginDTO, response: Response):
-    user = auth_helpers.authenticate_user(form_data.username, form_data.password)
+async def login(form_data: LoginDTO, response: Response):
+    user = await auth_helpers.authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -60,7 +69,9 @@ def login(form_data: LoginDTO, response: Response):
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth_helpers.create_access_token(data={"sub": user.email}, expires_delta=access_token_expires)
+    access_token = auth_helpers.create_access_token(
+        data=auth_helpers.get_token_claims(user), expires_delta=access_token_expires
+    )
     token_value = quote(f"Bearer {access_token}")
     response.set_cookie(key="access_token", value=token_value, httponly=True, samesite="none", secure=True)
     return {"access_token": access_token, "token_type": "bearer"}
@@ -89,9 +100,19 @@ def confirm_email(verification_token: str):
     result = auth_queries.set_verified_user(user.id)
     if not result:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id {user.id} not found")
+    auth_helpers.invalidate_principal(user_id=user.id)
     return {"message": "User activated"}
 
 
+async def get_current_user(current_user: Union[User, Principal]):
+    if isinstance(current_user, User):
+        return current_user
+    user = await auth_queries.get_user_by_id(current_user.id)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id {current_user.id} not found")
+    return user
+
+
 def get_user(username: str):
     user = auth_queries.get_user_by_username(username)
     if not user:
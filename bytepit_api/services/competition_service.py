@@ -1,11 +1,14 @@
 import datetime
 import uuid
+
+from typing import List, Union
 from fastapi import status, HTTPException, Response
 
 
 from bytepit_api.database import competition_queries, problem_queries, auth_queries
 from bytepit_api.helpers import competition_helpers
 
+from bytepit_api.models.db_models import Competition
 from bytepit_api.models.dtos import (
     CompetitionDTO,
     CreateCompetitionDTO,
@@ -15,65 +18,63 @@ from bytepit_api.models.dtos import (
 )
 
 
-def get_all_competitions(user_id: uuid.UUID, send_trophies: bool = False):
-    competitions = competition_queries.get_competitions(user_id)
+async def get_competition_dtos(competitions: List[Competition], send_trophies: bool = False):
+    if not competitions:
+        return []
+    competition_ids = [competition.id for competition in competitions]
+    organiser_ids = list({competition.organiser_id for competition in competitions})
+    organiser_usernames = await auth_queries.get_usernames_by_ids(organiser_ids)
+    problems_by_competition = await competition_queries.get_problems_by_competitions(competition_ids)
+    trophies_by_competition = (
+        await competition_queries.get_trophies_by_competitions(competition_ids) if send_trophies else {}
+    )
+
     competitions_dtos = []
     for competition in competitions:
-        organiser = auth_queries.get_user_by_id(competition.organiser_id)
-        problems = problem_queries.get_problems_by_competition(competition.id)
-        trophies = competition_queries.get_trophies_by_competition(competition.id)
-
         competition_dict = competition.model_dump(exclude={"problems"})
         competition_dto = CompetitionDTO(**competition_dict)
-        competition_dto.organiser_username = organiser.username
-        competition_dto.problems = [ProblemDTO(**problem.model_dump()) for problem in problems]
+        competition_dto.organiser_username = organiser_usernames.get(competition.organiser_id)
+        competition_dto.problems = [
+            ProblemDTO(**problem.model_dump()) for problem in problems_by_competition[competition.id]
+        ]
         if send_trophies:
-            competition_dto.trophies = [TrophyDTO(**trophy.model_dump()) for trophy in trophies]
+            competition_dto.trophies = [
+                TrophyDTO(**trophy.model_dump()) for trophy in trophies_by_competition[competition.id]
+            ]
         competitions_dtos.append(competition_dto)
 
     return competitions_dtos
 
 
-def get_random_competition():
-    competition = competition_queries.get_random_competition()
+async def get_all_competitions(user_id: uuid.UUID, send_trophies: bool = False):
+    competitions = await competition_queries.get_competitions(user_id)
+    return await get_competition_dtos(competitions, send_trophies)
+
+
+async def get_random_competition():
+    competition = await competition_queries.get_random_competition()
     if not competition:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No competitions found",
         )
-    organiser = auth_queries.get_user_by_id(competition.organiser_id)
-    problems = problem_queries.get_problems_by_competition(competition.id)
-    trophies = competition_queries.get_trophies_by_competition(competition.id)
-
-    competition_dict = competition.model_dump(exclude={"problems"})
-    competition_dto = CompetitionDTO(**competition_dict)
-    competition_dto.organiser_username = organiser.username
-    competition_dto.problems = [ProblemDTO(**problem.model_dump()) for problem in problems]
-    competition_dto.trophies = [TrophyDTO(**trophy.model_dump()) for trophy in trophies]
-    return competition_dto
+    competition_dtos = await get_competition_dtos([competition], send_trophies=True)
+    return competition_dtos[0]
 
 
-def get_competition(competition_id: uuid.UUID):
-    competition = competition_queries.get_competition(competition_id)
+async def get_competition(competition_id: uuid.UUID):
+    competition = await competition_queries.get_competition(competition_id)
     if not competition:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No competition with id {competition_id} found",
         )
-    oraganiser = auth_queries.get_user_by_id(competition.organiser_id)
-    problems = problem_queries.get_problems_by_competition(competition.id)
-    trophies = competition_queries.get_trophies_by_competition(competition.id)
+    competition_dtos = await get_competition_dtos([competition], send_trophies=True)
+    return competition_dtos[0]
 
-    competition_dict = competition.model_dump(exclude={"problems"})
-    competition_dto = CompetitionDTO(**competition_dict)
-    competition_dto.organiser_username = oraganiser.username
-    competition_dto.problems = [ProblemDTO(**problem.model_dump()) for problem in problems]
-    competition_dto.trophies = [TrophyDTO(**trophy.model_dump()) for trophy in trophies]
-    return competition_dto
 
-
-def create_competition(form_data: CreateCompetitionDTO, current_user: uuid.UUID):
-    problems = competition_queries.get_problems(form_data.problems)
+async def create_competition(form_data: CreateCompetitionDTO, current_user: uuid.UUID):
+    problems = await competition_queries.get_problems(form_data.problems)
     if len(problems) != len(form_data.problems):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -86,7 +87,7 @@ def create_competition(form_data: CreateCompetitionDTO, current_user: uuid.UUID)
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid trophies",
         )
-    result = competition_queries.insert_competition(
+    result = await competition_queries.insert_competition(
         form_data.name,
         form_data.description,
         form_data.start_time,
@@ -94,32 +95,33 @@ def create_competition(form_data: CreateCompetitionDTO, current_user: uuid.UUID)
         form_data.problems,
         current_user,
         form_data.parent_id,
+        form_data.judging_policy,
     )
     if not result:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Something went wrong. Please try again.",
         )
-    competition_queries.insert_trophy(result, 1, form_data.first_place_trophy)
-    competition_queries.insert_trophy(result, 2, form_data.second_place_trophy)
-    competition_queries.insert_trophy(result, 3, form_data.third_place_trophy)
+    await competition_queries.insert_trophy(result, 1, form_data.first_place_trophy)
+    await competition_queries.insert_trophy(result, 2, form_data.second_place_trophy)
+    await competition_queries.insert_trophy(result, 3, form_data.third_place_trophy)
     return Response(status_code=status.HTTP_201_CREATED)
 
 
-def create_virtual_competition(parent_competition_id: uuid.UUID, current_user: uuid.UUID):
-    competition = competition_queries.get_competition(parent_competition_id)
+async def create_virtual_competition(parent_competition_id: uuid.UUID, current_user: uuid.UUID):
+    competition = await competition_queries.get_competition(parent_competition_id)
     if not competition:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Parent competition not found",
         )
-    problems = problem_queries.get_problems_by_competition(parent_competition_id)
+    problems = await problem_queries.get_problems_by_competition(parent_competition_id)
     problem_ids = [problem.id for problem in problems]
     competition_duration = competition.end_time - competition.start_time
     competition_start_time = datetime.datetime.now()
     competition_end_time = competition_start_time + competition_duration
 
-    result = competition_queries.insert_competition(
+    result = await competition_queries.insert_competition(
         competition.name,
         competition.description,
         competition_start_time,
@@ -127,6 +129,7 @@ def create_virtual_competition(parent_competition_id: uuid.UUID, current_user: u
         problem_ids,
         current_user,
         parent_competition_id,
+        competition.judging_policy,
     )
     if not result:
         raise HTTPException(
@@ -136,17 +139,17 @@ def create_virtual_competition(parent_competition_id: uuid.UUID, current_user: u
     return Response(status_code=status.HTTP_201_CREATED, content=str(result))
 
 
-def modify_competition(competition_id: uuid.UUID, form_data: ModifyCompetitionDTO):
+async def modify_competition(competition_id: uuid.UUID, form_data: ModifyCompetitionDTO):
     if form_data.problems == []:
         form_data.problems = None
     else:
-        problems = competition_queries.get_problems(form_data.problems)
+        problems = await competition_queries.get_problems(form_data.problems)
         if len(problems) != len(form_data.problems):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid problems",
             )
-    competition_to_modify = competition_queries.get_competition(competition_id)
+    competition_to_modify = await competition_queries.get_competition(competition_id)
     if not competition_to_modify:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -156,7 +159,7 @@ def modify_competition(competition_id: uuid.UUID, form_data: ModifyCompetitionDT
         exclude_none=True, exclude={"first_place_trophy", "second_place_trophy", "third_place_trophy"}
     )
     modified_object = competition_to_modify.model_copy(update=modified_fields)
-    if not competition_queries.modify_competition(competition_id, modified_object):
+    if not await competition_queries.modify_competition(competition_id, modified_object):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Something went wrong. Please try again.",
@@ -173,15 +176,15 @@ def modify_competition(competition_id: uuid.UUID, form_data: ModifyCompetitionDT
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid trophies",
             )
-        competition_queries.delete_trophy_by_competition_id(competition_id)
-        competition_queries.insert_trophy(competition_id, 1, form_data.first_place_trophy)
-        competition_queries.insert_trophy(competition_id, 2, form_data.second_place_trophy)
-        competition_queries.insert_trophy(competition_id, 3, form_data.third_place_trophy)
+        await competition_queries.delete_trophy_by_competition_id(competition_id)
+        await competition_queries.insert_trophy(competition_id, 1, form_data.first_place_trophy)
+        await competition_queries.insert_trophy(competition_id, 2, form_data.second_place_trophy)
+        await competition_queries.insert_trophy(competition_id, 3, form_data.third_place_trophy)
     return Response(status_code=status.HTTP_200_OK)
 
 
-def delete_competition(competition_id: uuid.UUID):
-    result = competition_queries.delete_competition(competition_id)
+async def delete_competition(competition_id: uuid.UUID):
+    result = await competition_queries.delete_competition(competition_id)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -190,22 +193,36 @@ def delete_competition(competition_id: uuid.UUID):
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
-def get_competition_results(competition_id: uuid.UUID, current_user_id: uuid.UUID):
-    competition = competition_queries.get_competition(competition_id)
+async def get_competition_results(
+    competition_id: uuid.UUID,
+    current_user_id: uuid.UUID,
+    limit: Union[int, None] = None,
+    offset: int = 0,
+    after_rank: Union[int, None] = None,
+    after_runtime: Union[float, None] = None,
+    after_user_id: Union[uuid.UUID, None] = None,
+):
+    cursor = (after_rank, after_runtime, after_user_id)
+    if any(value is not None for value in cursor) and any(value is None for value in cursor):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="after_rank, after_runtime and after_user_id must be given together",
+        )
+    competition = await competition_queries.get_competition(competition_id)
     if not competition:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No competition with id {competition_id} found",
         )
-    results = competition_queries.get_competition_results(competition_id)
-    for result in results:
-        user_id = result["user_id"]
-        user = auth_queries.get_user_by_id(user_id)
-        result["username"] = user.username
+    results = await competition_queries.get_competition_results(
+        competition_id, limit, offset, cursor if after_rank is not None else None
+    )
 
     user_result = next((result for result in results if result["user_id"] == current_user_id), None)
+    if not user_result:
+        user_results = await competition_queries.get_competition_results(competition_id, user_id=current_user_id)
+        user_result = user_results[0] if user_results else None
     correct_problems_by_user = []
-    print(user_result)
     if user_result:
         for problem in user_result["problem_results"]:
             if problem["is_correct"]:
@@ -220,62 +237,34 @@ def get_competition_results(competition_id: uuid.UUID, current_user_id: uuid.UUI
     return results
 
 
-def get_virtual_competition_results(competition_id: uuid.UUID, current_user_id: uuid.UUID):
-    competition = competition_queries.get_competition(competition_id)
-    if not competition:
+async def get_competition_result_for_user(competition_id: uuid.UUID, current_user_id: uuid.UUID):
+    results = await competition_queries.get_competition_results(competition_id, user_id=current_user_id)
+    if not results:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"No competition with id {competition_id} found",
+            detail=f"No result for user with id {current_user_id} in competition with id {competition_id} found",
         )
-    results = competition_queries.get_competition_results(competition.parent_id)
+    return results[0]
 
-    for result in results:
-        if result["user_id"] == current_user_id:
-            results.remove(result)
 
-    user_virtual_result = problem_queries.get_virtual_competition_results_for_user(competition_id, current_user_id)
-    if not user_virtual_result:
+async def get_virtual_competition_results(competition_id: uuid.UUID, current_user_id: uuid.UUID):
+    competition = await competition_queries.get_competition(competition_id)
+    if not competition:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No competition with id {competition_id} found",
+        )
+    results = await competition_queries.get_virtual_competition_results(
+        competition_id, competition.parent_id, current_user_id
+    )
+    if not results:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No virtual competition result for user with id {current_user_id} found",
         )
-    results.append(user_virtual_result)
-
-    results = sorted(results, key=lambda x: x["total_points"], reverse=True)
-
-    if len(results) == 1:
-        results[0]["rank_in_competition"] = 1
-        results[0]["username"] = auth_queries.get_user_by_id(results[0]["user_id"]).username
-        return results
-
-    for i in range(len(results)):
-        if results[i - 1]["total_points"] == results[i]["total_points"]:
-            results[i]["rank_in_competition"] = results[i - 1]["rank_in_competition"]
-        else:
-            if i == 0:
-                results[i]["rank_in_competition"] = 1
-            else:
-                results[i]["rank_in_competition"] = results[i - 1]["rank_in_competition"] + 1
-
-    for result in results:
-        user_id = result["user_id"]
-        user = auth_queries.get_user_by_id(user_id)
-        result["username"] = user.username
     return results
 
 
-def get_competitions_by_organiser(organiser_id: uuid.UUID, send_trophies: bool = False):
-    competitions = competition_queries.get_competitions_by_organiser(organiser_id)
-    competitions_dtos = []
-    for competition in competitions:
-        problems = problem_queries.get_problems_by_competition(competition.id)
-        trophies = competition_queries.get_trophies_by_competition(competition.id)
-
-        competition_dict = competition.model_dump(exclude={"problems"})
-        competition_dto = CompetitionDTO(**competition_dict)
-        competition_dto.problems = [ProblemDTO(**problem.model_dump()) for problem in problems]
-        if send_trophies:
-            competition_dto.trophies = [TrophyDTO(**trophy.model_dump()) for trophy in trophies]
-        competitions_dtos.append(competition_dto)
-
-    return competitions_dtos
+async def get_competitions_by_organiser(organiser_id: uuid.UUID, send_trophies: bool = False):
+    competitions = await competition_queries.get_competitions_by_organiser(organiser_id)
+    return await get_competition_dtos(competitions, send_trophies)
@@ -1,11 +1,24 @@
+import contextlib
+import os
 import uuid
 
 from datetime import datetime
 from fastapi import HTTPException, status, Response
+from fastapi.concurrency import run_in_threadpool
 
-from bytepit_api.database import problem_queries, competition_queries
-from bytepit_api.helpers import blob_storage_helpers, problem_helpers, submission_helpers
-from bytepit_api.models.dtos import CreateSubmissionDTO, CreateProblemDTO, ModifyProblemDTO, TrophiesByUserDTO
+from bytepit_api.database import problem_queries, competition_queries, submission_queries
+from bytepit_api.helpers import blob_storage_helpers, judge_helpers, problem_helpers, submission_helpers
+from bytepit_api.models.db_models import JudgingPolicy, Problem, Submission
+from bytepit_api.models.dtos import (
+    CreateSubmissionDTO,
+    CreateProblemDTO,
+    ModifyProblemDTO,
+    SubmissionDTO,
+    TrophiesByUserDTO,
+)
+
+
+JUDGE_STALE_AFTER_SECONDS = int(os.environ.get("JUDGE_STALE_AFTER_SECONDS", 600))
 
 
 def get_all_problems():
@@ -16,10 +29,10 @@ def get_available_problems():
     return problem_queries.get_available_problems()
 
 
-def get_user_statistics(user_id: uuid.UUID):
-    trophies = competition_queries.get_trophies_by_user(user_id)
+async def get_user_statistics(user_id: uuid.UUID):
+    trophies = await competition_queries.get_trophies_by_user(user_id)
     trophies_dto = [TrophiesByUserDTO(**trophy) for trophy in trophies]
-    user_statistics_without_trophies = problem_queries.get_user_statistics(user_id)
+    user_statistics_without_trophies = await problem_queries.get_user_statistics(user_id)
     user_statistics = {
         **user_statistics_without_trophies,
         "trophies": trophies_dto,
@@ -42,6 +55,7 @@ def delete_problem(problem_id: uuid.UUID):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Could not delete problem with id {problem_id}"
         )
     blob_storage_helpers.delete_all_blobs(problem_id)
+    submission_helpers.invalidate_verdicts(problem_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -51,9 +65,13 @@ def create_problem(problem: CreateProblemDTO, current_user_id: uuid.UUID):
     problem_id = problem_queries.insert_problem(problem, current_user_id)
     if not problem_id:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not insert problem")
-    for test_file in problem.test_files:
-        data = test_file.file.read()
-        blob_storage_helpers.upload_blob(f"{problem_id}/{test_file.filename}", data)
+    try:
+        problem_helpers.upload_tests(problem_id, problem.test_files)
+    except HTTPException:
+        with contextlib.suppress(HTTPException):
+            blob_storage_helpers.delete_all_blobs(problem_id)
+        problem_queries.delete_problem(problem_id)
+        raise
     return Response(status_code=status.HTTP_201_CREATED)
 
 
@@ -66,14 +84,15 @@ def modify_problem(problem_id: uuid.UUID, problem: ModifyProblemDTO):
     return Response(status_code=status.HTTP_200_OK)
 
 
-def create_submission(current_user_id: uuid.UUID, submission: CreateSubmissionDTO):
-    problem = problem_helpers.get_problem(submission.problem_id)
+async def create_submission(current_user_id: uuid.UUID, submission: CreateSubmissionDTO):
+    problem = await run_in_threadpool(problem_helpers.get_problem, submission.problem_id)
     if not problem:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Could not found problem")
+    judging_policy = JudgingPolicy.full
     if submission.competition_id:
-        competition = competition_queries.get_competition(submission.competition_id)
+        competition = await competition_queries.get_competition(submission.competition_id)
         if not competition:
-            competition = competition_queries.get_virtual_competition(submission.competition_id)
+            competition = await competition_queries.get_virtual_competition(submission.competition_id)
         if not competition:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Could not found competition")
         if (
@@ -82,12 +101,92 @@ def create_submission(current_user_id: uuid.UUID, submission: CreateSubmissionDT
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Competition is not running")
         if problem.id not in competition.problems:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Problem is not in competition")
-    submission_results = []
-    for test_idx, test_dict in blob_storage_helpers.get_all_tests(submission.problem_id).items():
-        result = submission_helpers.evaluate_problem_submission(
-            submission.source_code, test_dict["in"], submission.language
+        judging_policy = competition.judging_policy
+    queued_submission = await run_in_threadpool(
+        submission_queries.insert_submission, current_user_id, submission, judging_policy
+    )
+    if not queued_submission:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not queue submission")
+    judge_helpers.enqueue_submission(queued_submission.id)
+    return SubmissionDTO(**queued_submission.model_dump())
+
+
+def get_failed_submission_result(exception: str):
+    return {
+        "is_correct": False,
+        "is_runtime_ok": False,
+        "has_improved": False,
+        "points": 0,
+        "incorrect_outputs": [],
+        "exception": exception,
+    }
+
+
+def judge_submission(submission_id: uuid.UUID):
+    submission = submission_queries.claim_submission(submission_id)
+    if not submission:
+        return
+    submission_result = get_failed_submission_result("Judging was interrupted")
+    try:
+        problem = problem_helpers.get_problem(submission.problem_id)
+        submission_result = evaluate_submission(problem, submission)
+    except HTTPException as e:
+        submission_result = get_failed_submission_result(str(e.detail))
+    except Exception as e:
+        print(e)
+        submission_result = get_failed_submission_result(f"Internal error while judging: {type(e).__name__}")
+    finally:
+        submission_queries.finish_submission(submission.id, submission_result)
+
+
+def requeue_pending_submissions():
+    submission_queries.requeue_stale_submissions(JUDGE_STALE_AFTER_SECONDS)
+    for submission_id in submission_queries.get_queued_submission_ids():
+        judge_helpers.enqueue_submission(submission_id)
+
+
+def get_submission_status(submission_id: uuid.UUID, user_id: uuid.UUID):
+    submission = submission_queries.get_submission(submission_id)
+    if not submission or submission.user_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Submission with id {submission_id} not found"
         )
+    return SubmissionDTO(**submission.model_dump())
+
 
+def evaluate_submission(problem: Problem, submission: Submission):
+    cached_tests = blob_storage_helpers.get_cached_tests(submission.problem_id)
+    tests = cached_tests["tests"]
+    test_dicts = [tests[test_idx] for test_idx in sorted(tests, key=int)]
+    submission_queries.set_submission_tests_total(submission.id, len(test_dicts))
+
+    def is_failed(test_idx: int, result: dict):
+        return (
+            bool(result["exception"])
+            or result["stdout"] != test_dicts[test_idx]["out"]
+            or result["executionTime"] >= problem.runtime_limit * 1000
+        )
+
+    verdict_key = submission_helpers.get_verdict_key(
+        submission.problem_id, cached_tests["version"], submission.language, submission.source_code
+    )
+    results = submission_helpers.verdict_cache.get(verdict_key)
+    if results is None or (None in results and submission.judging_policy == JudgingPolicy.full):
+        results = submission_helpers.evaluate_problem_submission_tests(
+            submission.source_code,
+            [test_dict["in"] for test_dict in test_dicts],
+            submission.language,
+            on_test_done=lambda: submission_queries.increment_submission_tests_done(submission.id),
+            is_failed=is_failed if submission.judging_policy == JudgingPolicy.fail_fast else None,
+        )
+        if submission_helpers.is_cacheable_verdict(results):
+            submission_helpers.verdict_cache.set(verdict_key, results)
+    else:
+        submission_queries.set_submission_tests_done(submission.id, len([result for result in results if result]))
+    submission_results = []
+    for test_dict, result in zip(test_dicts, results):
+        if result is None:
+            continue
         if result["exception"]:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result["exception"])
 
@@ -112,14 +211,14 @@ def create_submission(current_user_id: uuid.UUID, submission: CreateSubmissionDT
         if submission_result["output"] != submission_result["expected_output"]
     ]
 
-    total_points = (correct_submissions / len(submission_results)) * problem.num_of_points
+    total_points = (correct_submissions / len(test_dicts)) * problem.num_of_points
     total_runtime = sum([submission_result["execution_time"] for submission_result in submission_results])
     average_runtime = total_runtime / len(submission_results)
     is_correct = total_points == problem.num_of_points
     has_improved = problem_queries.insert_problem_result(
         submission.problem_id,
         submission.competition_id,
-        current_user_id,
+        submission.user_id,
         average_runtime,
         is_correct,
         total_points,
@@ -132,7 +231,7 @@ def create_submission(current_user_id: uuid.UUID, submission: CreateSubmissionDT
         "has_improved": has_improved,
         "points": total_points,
         "incorrect_outputs": incorrect_outputs,
-        "exception": result["exception"] if result["exception"] else None,
+        "exception": None,
     }
 
 
@@ -0,0 +1,5 @@
+import os
+
+from bytepit_api.storage.backends import get_storage_backend
+
+storage = get_storage_backend(os.environ.get("STORAGE_BACKEND", "azure"))
@@ -0,0 +1,356 @@
+import mmap
+import os
+import tempfile
+import threading
+import uuid
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import AsyncIterator, BinaryIO, Dict, Iterator, List, Tuple, Union
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from pydantic import BaseModel
+
+
+CHUNK_SIZE = 4 * 1024 * 1024
+DELETE_BATCH_SIZE = 256
+
+
+class BlobProperties(BaseModel):
+    name: str
+    etag: str
+    size: Union[int, None] = None
+    last_modified: Union[datetime, None] = None
+    content_type: Union[str, None] = None
+
+
+class BlobNotFoundError(Exception):
+    pass
+
+
+class BlobModifiedError(Exception):
+    pass
+
+
+def read_chunks(data: Union[bytes, BinaryIO]):
+    if isinstance(data, (bytes, bytearray)):
+        yield bytes(data)
+        return
+    while chunk := data.read(CHUNK_SIZE):
+        yield chunk
+
+
+def get_range_end(size: int, offset: int, length: Union[int, None]):
+    return size if length is None else min(offset + length, size)
+
+
+class StorageBackend(ABC):
+    @abstractmethod
+    def upload(self, name: str, data: Union[bytes, BinaryIO]) -> BlobProperties:
+        pass
+
+    @abstractmethod
+    def get_properties(self, name: str) -> BlobProperties:
+        pass
+
+    @abstractmethod
+    def download(self, name: str) -> Tuple[bytes, BlobProperties]:
+        pass
+
+    @abstractmethod
+    def iter_chunks(
+        self, name: str, offset: int = 0, length: Union[int, None] = None, etag: Union[str, None] = None
+    ) -> Iterator[bytes]:
+        pass
+
+    @abstractmethod
+    def delete_many(self, names: List[str]) -> Dict[str, str]:
+        pass
+
+    @abstractmethod
+    def list(self, prefix: str) -> List[BlobProperties]:
+        pass
+
+    def read(self, name: str):
+        return self.download(name)[0]
+
+    async def get_properties_async(self, name: str):
+        return await run_in_threadpool(self.get_properties, name)
+
+    async def open_stream(
+        self, name: str, offset: int = 0, length: Union[int, None] = None, etag: Union[str, None] = None
+    ) -> AsyncIterator[bytes]:
+        chunks = await run_in_threadpool(self.iter_chunks, name, offset, length, etag)
+        return iterate_in_threadpool(chunks)
+
+    async def close(self):
+        pass
+
+
+class AzureStorage(StorageBackend):
+    def __init__(self, connection_string: str, container: str):
+        self.container = container
+        self.client = BlobServiceClient.from_connection_string(connection_string)
+        self.async_client = AsyncBlobServiceClient.from_connection_string(connection_string)
+
+    def get_blob_client(self, name: str):
+        return self.client.get_blob_client(container=self.container, blob=name)
+
+    @staticmethod
+    def to_properties(name: str, properties):
+        return BlobProperties(
+            name=name,
+            etag=properties.etag,
+            size=properties.size,
+            last_modified=properties.last_modified,
+            content_type=properties.content_settings.content_type,
+        )
+
+    @staticmethod
+    def get_download_options(offset: int, length: Union[int, None], etag: Union[str, None]):
+        options = {}
+        if offset or length is not None:
+            options.update({"offset": offset, "length": length})
+        if etag is not None:
+            options.update({"etag": etag, "match_condition": MatchConditions.IfNotModified})
+        return options
+
+    def upload(self, name: str, data: Union[bytes, BinaryIO]):
+        result = self.get_blob_client(name).upload_blob(data)
+        return BlobProperties(name=name, etag=result["etag"], last_modified=result.get("last_modified"))
+
+    def get_properties(self, name: str):
+        try:
+            return self.to_properties(name, self.get_blob_client(name).get_blob_properties())
+        except ResourceNotFoundError:
+            raise BlobNotFoundError(name)
+
+    def download(self, name: str):
+        try:
+            downloader = self.get_blob_client(name).download_blob()
+        except ResourceNotFoundError:
+            raise BlobNotFoundError(name)
+        return downloader.readall(), self.to_properties(name, downloader.properties)
+
+    def iter_chunks(self, name: str, offset: int = 0, length: Union[int, None] = None, etag: Union[str, None] = None):
+        try:
+            downloader = self.get_blob_client(name).download_blob(**self.get_download_options(offset, length, etag))
+        except ResourceNotFoundError:
+            raise BlobNotFoundError(name)
+        except ResourceModifiedError:
+            raise BlobModifiedError(name)
+        return downloader.chunks()
+
+    def delete_many(self, names: List[str]):
+        container_client = self.client.get_container_client(container=self.container)
+        failed_files = {}
+        for start in range(0, len(names), DELETE_BATCH_SIZE):
+            batch = names[start : start + DELETE_BATCH_SIZE]
+            try:
+                responses = container_client.delete_blobs(*batch, raise_on_any_failure=False)
+                for name, response in zip(batch, responses):
+                    if response.status_code not in (202, 404):
+                        failed_files[name] = response.reason
+            except Exception as e:
+                failed_files.update({name: str(e) for name in batch})
+        return failed_files
+
+    def list(self, prefix: str):
+        container_client = self.client.get_container_client(container=self.container)
+        return [self.to_properties(blob.name, blob) for blob in container_client.list_blobs(name_starts_with=prefix)]
+
+    async def get_properties_async(self, name: str):
+        blob_client = self.async_client.get_blob_client(container=self.container, blob=name)
+        try:
+            return self.to_properties(name, await blob_client.get_blob_properties())
+        except ResourceNotFoundError:
+            raise BlobNotFoundError(name)
+
+    async def open_stream(
+        self, name: str, offset: int = 0, length: Union[int, None] = None, etag: Union[str, None] = None
+    ):
+        blob_client = self.async_client.get_blob_client(container=self.container, blob=name)
+        try:
+            downloader = await blob_client.download_blob(**self.get_download_options(offset, length, etag))
+        except ResourceNotFoundError:
+            raise BlobNotFoundError(name)
+        except ResourceModifiedError:
+            raise BlobModifiedError(name)
+        return downloader.chunks()
+
+    async def close(self):
+        await self.async_client.close()
+        self.client.close()
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def get_path(self, name: str):
+        path = os.path.abspath(os.path.join(self.root, name))
+        if os.path.commonpath([self.root, path]) != self.root or path == self.root:
+            raise BlobNotFoundError(name)
+        return path
+
+    @staticmethod
+    def to_properties(name: str, stat: os.stat_result):
+        return BlobProperties(
+            name=name,
+            etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            size=stat.st_size,
+            last_modified=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        )
+
+    def upload(self, name: str, data: Union[bytes, BinaryIO]):
+        path = self.get_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+        try:
+            with os.fdopen(file_descriptor, "wb") as temp_file:
+                if isinstance(data, (bytes, bytearray)):
+                    temp_file.write(data)
+                else:
+                    self.copy_file(data, temp_file)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return self.to_properties(name, os.stat(path))
+
+    @staticmethod
+    def copy_file(source: BinaryIO, destination: BinaryIO):
+        try:
+            source_descriptor = source.fileno()
+        except (AttributeError, OSError, ValueError):
+            for chunk in read_chunks(source):
+                destination.write(chunk)
+            return
+        destination.flush()
+        offset = source.tell()
+        while sent := os.sendfile(destination.fileno(), source_descriptor, offset, CHUNK_SIZE):
+            offset += sent
+        source.seek(offset)
+
+    def get_properties(self, name: str):
+        try:
+            return self.to_properties(name, os.stat(self.get_path(name)))
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            raise BlobNotFoundError(name)
+
+    def download(self, name: str):
+        try:
+            with open(self.get_path(name), "rb") as file:
+                stat = os.fstat(file.fileno())
+                if stat.st_size == 0:
+                    return b"", self.to_properties(name, stat)
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                    return mapped_file[:], self.to_properties(name, stat)
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            raise BlobNotFoundError(name)
+
+    def iter_chunks(self, name: str, offset: int = 0, length: Union[int, None] = None, etag: Union[str, None] = None):
+        try:
+            file = open(self.get_path(name), "rb")
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            raise BlobNotFoundError(name)
+        stat = os.fstat(file.fileno())
+        if etag is not None and self.to_properties(name, stat).etag != etag:
+            file.close()
+            raise BlobModifiedError(name)
+        if stat.st_size == 0:
+            file.close()
+            return iter([])
+        mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.generate_chunks(file, mapped_file, offset, get_range_end(stat.st_size, offset, length))
+
+    @staticmethod
+    def generate_chunks(file: BinaryIO, mapped_file: mmap.mmap, start: int, end: int):
+        try:
+            for position in range(start, end, CHUNK_SIZE):
+                yield mapped_file[position : min(position + CHUNK_SIZE, end)]
+        finally:
+            mapped_file.close()
+            file.close()
+
+    def delete_many(self, names: List[str]):
+        failed_files = {}
+        for name in names:
+            try:
+                path = self.get_path(name)
+                os.remove(path)
+            except (BlobNotFoundError, FileNotFoundError):
+                continue
+            except OSError as e:
+                failed_files[name] = str(e)
+                continue
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass
+        return failed_files
+
+    def list(self, prefix: str):
+        blobs = []
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                name = os.path.relpath(os.path.join(directory, file_name), self.root).replace(os.sep, "/")
+                if name.startswith(prefix) and not file_name.startswith(".upload-"):
+                    blobs.append(self.get_properties(name))
+        return sorted(blobs, key=lambda blob: blob.name)
+
+
+class MemoryStorage(StorageBackend):
+    def __init__(self):
+        self.blobs = {}
+        self.lock = threading.Lock()
+
+    def upload(self, name: str, data: Union[bytes, BinaryIO]):
+        content = b"".join(read_chunks(data))
+        properties = BlobProperties(
+            name=name, etag=f'"{uuid.uuid4().hex}"', size=len(content), last_modified=datetime.now(timezone.utc)
+        )
+        with self.lock:
+            self.blobs[name] = (content, properties)
+        return properties
+
+    def download(self, name: str):
+        with self.lock:
+            if name not in self.blobs:
+                raise BlobNotFoundError(name)
+            return self.blobs[name]
+
+    def get_properties(self, name: str):
+        return self.download(name)[1]
+
+    def iter_chunks(self, name: str, offset: int = 0, length: Union[int, None] = None, etag: Union[str, None] = None):
+        content, properties = self.download(name)
+        if etag is not None and properties.etag != etag:
+            raise BlobModifiedError(name)
+        end = get_range_end(len(content), offset, length)
+        return iter([content[position : min(position + CHUNK_SIZE, end)] for position in range(offset, end, CHUNK_SIZE)])
+
+    def delete_many(self, names: List[str]):
+        with self.lock:
+            for name in names:
+                self.blobs.pop(name, None)
+        return {}
+
+    def list(self, prefix: str):
+        with self.lock:
+            return [properties for name, (_, properties) in sorted(self.blobs.items()) if name.startswith(prefix)]
+
+
+def get_storage_backend(backend: str):
+    if backend == "local":
+        return LocalStorage(os.environ.get("STORAGE_ROOT", "storage"))
+    if backend == "memory":
+        return MemoryStorage()
+    return AzureStorage(
+        os.environ.get("BLOB_STORAGE_CONNECTION_STRING"), os.environ.get("BLOB_STORAGE_CONTAINER_NAME")
+    )
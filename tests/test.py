@@ -11,9 +11,45 @@ from fastapi import HTTPException
 os.environ[
     "SECRET_KEY"
 ] = "5ce3b19d23543100e7be58f39c430a8dfb1b4584fec88283583515b05481cdf4"
+os.environ["STORAGE_BACKEND"] = "memory"
 sys.modules["bytepit_api.database"] = MagicMock()
 sys.modules["bytepit_api.helpers.email_helpers"] = MagicMock()
 sys.modules["bytepit_api.database.problem_queries"] = MagicMock()
+sys.modules["bytepit_api.database.admin_queries"] = MagicMock()
+
+
+def make_user(**fields):
+    import uuid
+
+    from bytepit_api.models.db_models import User
+
+    user = {
+        "id": uuid.uuid4(),
+        "password_hash": "hash",
+        "username": "user",
+        "email": "user@example.com",
+        "role": "contestant",
+        "name": "Test",
+        "surname": "User",
+        "is_verified": True,
+        "approved_by_admin": True,
+    }
+    return User(**{**user, **fields})
+
+
+def import_database_module(name):
+    import importlib
+    import types
+
+    import bytepit_api
+
+    database = types.ModuleType("bytepit_api.database")
+    database.__path__ = [os.path.join(os.path.dirname(bytepit_api.__file__), "database")]
+    database.db = MagicMock()
+    database.async_db = MagicMock()
+    with patch.dict(sys.modules, {"bytepit_api.database": database}):
+        sys.modules.pop(f"bytepit_api.database.{name}", None)
+        return importlib.import_module(f"bytepit_api.database.{name}")
 
 
 @pytest.mark.asyncio
@@ -24,8 +60,8 @@ async def test_register_bad():
     database.auth_queries = AsyncMock()
     database.auth_queries.get_user_by_email = MagicMock(return_value=False)
     database.auth_queries.get_user_by_username = MagicMock(return_value=False)
-    database.auth_queries.create_user = AsyncMock(return_value=True)
-    email_helpers.send_verification_email = AsyncMock()
+    database.auth_queries.create_user = MagicMock(return_value=True)
+    email_helpers.wake_email_sender = MagicMock()
 
     with pytest.raises(pydantic.ValidationError):
         form_data = RegisterDTO(
@@ -41,15 +77,15 @@ async def test_register_bad():
 
 @pytest.mark.asyncio
 async def test_register_good():
-    from bytepit_api import database
-    from bytepit_api.helpers import email_helpers
-    from bytepit_api.services.auth_service import register
+    from bytepit_api.services import auth_service
 
-    database.auth_queries = AsyncMock()
-    database.auth_queries.get_user_by_email = MagicMock(return_value=False)
-    database.auth_queries.get_user_by_username = MagicMock(return_value=False)
-    database.auth_queries.create_user = AsyncMock(return_value=True)
-    email_helpers.send_verification_email = AsyncMock()
+    auth_queries = MagicMock()
+    auth_queries.get_user_by_email = MagicMock(return_value=False)
+    auth_queries.get_user_by_username = MagicMock(return_value=False)
+    auth_queries.create_user = MagicMock(return_value=True)
+    email_helpers = MagicMock()
+    verification_email = {"recipient": "fdge@gmail.com", "subject": "s", "html": "h", "plaintext": "p"}
+    email_helpers.render_verification_email = MagicMock(return_value=verification_email)
 
     form_data = RegisterDTO(
         username="testuser",
@@ -61,10 +97,22 @@ async def test_register_good():
         image=None,
     )
 
-    response = await register(form_data)
+    with patch.object(auth_service, "auth_queries", auth_queries), patch.object(
+        auth_service, "email_helpers", email_helpers
+    ):
+        response = await auth_service.register(form_data)
+
+        assert response.status_code == 201
+        assert auth_queries.create_user.call_args.args[-1] == verification_email
+        email_helpers.wake_email_sender.assert_called_once()
+
+        auth_queries.create_user.return_value = False
+        email_helpers.wake_email_sender.reset_mock()
+        with pytest.raises(HTTPException) as exc_info:
+            await auth_service.register(form_data)
 
-    assert response.status_code == 201
-    email_helpers.send_verification_email.assert_called_once()
+    assert exc_info.value.status_code == 500
+    email_helpers.wake_email_sender.assert_not_called()
 
 
 def test_create_problem():
@@ -72,12 +120,13 @@ def test_create_problem():
     from io import BytesIO
 
     from fastapi import UploadFile, Response
-    from bytepit_api import database
+    from bytepit_api.helpers import blob_storage_helpers
     from bytepit_api.models.dtos import CreateProblemDTO
-    from bytepit_api.services.problem_service import create_problem
+    from bytepit_api.services import problem_service
+    from bytepit_api.storage.backends import MemoryStorage
 
-    database.problem_queries = AsyncMock()
-    database.problem_queries.insert_problem = AsyncMock(return_value=uuid.uuid4())
+    problem_queries = MagicMock()
+    problem_queries.insert_problem.return_value = uuid.uuid4()
     problem_dto_mock = MagicMock(spec=CreateProblemDTO)
     problem_dto_mock.name = "Test Problem"
     problem_dto_mock.example_input = "Example Input"
@@ -101,10 +150,43 @@ def test_create_problem():
 
     current_user_id = uuid.uuid4()
 
-    result = create_problem(problem_dto_mock, current_user_id)
+    storage = MemoryStorage()
+    with patch.object(problem_service, "problem_queries", problem_queries), patch.object(
+        blob_storage_helpers, "storage", storage
+    ):
+        result = problem_service.create_problem(problem_dto_mock, current_user_id)
 
     assert isinstance(result, Response)
     assert result.status_code == 201
+    assert len(storage.list("")) == 3
+
+
+def test_create_problem_removes_problem_when_tests_fail():
+    import uuid
+
+    from fastapi import UploadFile
+    from bytepit_api.helpers import blob_storage_helpers, problem_helpers
+    from bytepit_api.models.dtos import CreateProblemDTO
+    from bytepit_api.services import problem_service
+
+    problem_id = uuid.uuid4()
+    problem_queries = MagicMock()
+    problem_queries.insert_problem.return_value = problem_id
+    problem_dto_mock = MagicMock(spec=CreateProblemDTO)
+    problem_dto_mock.test_files = [MagicMock(spec=UploadFile), MagicMock(spec=UploadFile)]
+    problem_dto_mock.test_files[0].filename = "1_in.txt"
+    problem_dto_mock.test_files[1].filename = "1_out.txt"
+    upload_tests = MagicMock(side_effect=HTTPException(status_code=413, detail="too large"))
+
+    with patch.object(problem_service, "problem_queries", problem_queries), patch.object(
+        problem_helpers, "upload_tests", upload_tests
+    ), patch.object(blob_storage_helpers, "delete_all_blobs") as delete_all_blobs:
+        with pytest.raises(HTTPException) as exc_info:
+            problem_service.create_problem(problem_dto_mock, uuid.uuid4())
+
+    assert exc_info.value.status_code == 413
+    delete_all_blobs.assert_called_once_with(problem_id)
+    problem_queries.delete_problem.assert_called_once_with(problem_id)
 
 
 def test_create_problem_bad():
@@ -142,23 +224,20 @@ def test_create_problem_bad():
         create_problem(problem_dto_mock, current_user_id)
 
 
-def test_create_competition():
+@pytest.mark.asyncio
+async def test_create_competition():
     from datetime import datetime
     import uuid
     from unittest.mock import AsyncMock, MagicMock
 
     from fastapi import Response
-    from bytepit_api import database
     from bytepit_api.models.dtos import CreateCompetitionDTO
-    from bytepit_api.services.competition_service import create_competition
+    from bytepit_api.services import competition_service
 
-    database.competition_queries = MagicMock()
-    database.competition_queries.insert_competition = AsyncMock(
-        return_value=uuid.uuid4()
-    )
     problemlist = [uuid.uuid4(), uuid.uuid4()]
-    database.competition_queries.get_problems = AsyncMock(return_value=problemlist)
-    print(len(problemlist))
+    competition_queries = AsyncMock()
+    competition_queries.insert_competition = AsyncMock(return_value=uuid.uuid4())
+    competition_queries.get_problems = AsyncMock(return_value=problemlist)
     competition_dto_mock = MagicMock(spec=CreateCompetitionDTO)
     competition_dto_mock.name = "Test Competition"
     competition_dto_mock.description = "This is a test competition"
@@ -171,31 +250,34 @@ def test_create_competition():
     competition_dto_mock.is_private = False
     competition_dto_mock.image = None
     competition_dto_mock.organiser_id = uuid.uuid4()
-    competition_dto_mock.problems = database.competition_queries.get_problems
+    competition_dto_mock.problems = problemlist
     competition_dto_mock.first_place_trophy = None
     competition_dto_mock.second_place_trophy = None
     competition_dto_mock.third_place_trophy = None
     competition_dto_mock.parent_id = uuid.uuid4()
+    competition_dto_mock.judging_policy = "full"
 
-    result = create_competition(competition_dto_mock, competition_dto_mock.organiser_id)
+    with patch.object(competition_service, "competition_queries", competition_queries):
+        result = await competition_service.create_competition(
+            competition_dto_mock, competition_dto_mock.organiser_id
+        )
 
     assert isinstance(result, Response)
     assert result.status_code == 201
 
 
-def test_create_competition_bad():
+@pytest.mark.asyncio
+async def test_create_competition_bad():
     from datetime import datetime
     import uuid
     from unittest.mock import AsyncMock, MagicMock
 
-    from bytepit_api import database
     from bytepit_api.models.dtos import CreateCompetitionDTO
-    from bytepit_api.services.competition_service import create_competition
+    from bytepit_api.services import competition_service
 
-    database.competition_queries = MagicMock()
-    database.competition_queries.insert_competition = AsyncMock(
-        return_value=uuid.uuid4()
-    )
+    competition_queries = AsyncMock()
+    competition_queries.insert_competition = AsyncMock(return_value=uuid.uuid4())
+    competition_queries.get_problems = AsyncMock(return_value=[])
 
     competition_dto_mock = MagicMock(spec=CreateCompetitionDTO)
     competition_dto_mock.name = "Test Competition"
@@ -215,5 +297,829 @@ def test_create_competition_bad():
     competition_dto_mock.third_place_trophy = None
     competition_dto_mock.parent_id = uuid.uuid4()
 
+    with patch.object(competition_service, "competition_queries", competition_queries):
+        with pytest.raises(HTTPException):
+            await competition_service.create_competition(competition_dto_mock, competition_dto_mock.organiser_id)
+
+
+@pytest.mark.asyncio
+async def test_get_all_competitions_batches_queries():
+    import uuid
+    from datetime import datetime
+
+    from bytepit_api.models.db_models import Competition
+    from bytepit_api.services import competition_service
+
+    organiser_id = uuid.uuid4()
+    competitions = [
+        Competition(
+            id=uuid.uuid4(),
+            name=f"Competition {i}",
+            description="This is a test competition",
+            start_time=datetime(2021, 1, 1),
+            end_time=datetime(2021, 1, 2),
+            organiser_id=organiser_id,
+            problems=[],
+        )
+        for i in range(5)
+    ]
+    competition_queries = AsyncMock()
+    competition_queries.get_competitions = AsyncMock(return_value=competitions)
+    competition_queries.get_problems_by_competitions = AsyncMock(
+        return_value={competition.id: [] for competition in competitions}
+    )
+    auth_queries = AsyncMock()
+    auth_queries.get_usernames_by_ids = AsyncMock(return_value={organiser_id: "organiser"})
+
+    with patch.object(competition_service, "competition_queries", competition_queries), patch.object(
+        competition_service, "auth_queries", auth_queries
+    ):
+        result = await competition_service.get_all_competitions(uuid.uuid4())
+
+    assert [competition.organiser_username for competition in result] == ["organiser"] * 5
+    competition_queries.get_problems_by_competitions.assert_awaited_once()
+    competition_queries.get_trophies_by_competitions.assert_not_awaited()
+    auth_queries.get_usernames_by_ids.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_competition_results_page_through_ties():
+    import uuid
+
+    from bytepit_api.services import competition_service
+
+    standings = sorted(
+        [
+            {"user_id": uuid.uuid4(), "rank_in_competition": rank, "total_runtime": runtime, "problem_results": []}
+            for rank, runtime in [(1, 5.0), (1, 5.0), (1, 5.0), (1, 7.0), (2, 1.0)]
+        ],
+        key=lambda row: (row["rank_in_competition"], row["total_runtime"], row["user_id"]),
+    )
+
+    async def get_competition_results(competition_id, limit=None, offset=0, after=None, user_id=None):
+        rows = [
+            row
+            for row in standings
+            if after is None or (row["rank_in_competition"], row["total_runtime"], row["user_id"]) > after
+        ]
+        return rows[offset:][:limit]
+
+    competition_queries = MagicMock()
+    competition_queries.get_competition = AsyncMock(return_value=MagicMock())
+    competition_queries.get_competition_results = get_competition_results
+    pages = []
+    cursor = {}
+    with patch.object(competition_service, "competition_queries", competition_queries):
+        while page := await competition_service.get_competition_results(uuid.uuid4(), uuid.uuid4(), 2, **cursor):
+            pages.append(page)
+            cursor = {
+                "after_rank": page[-1]["rank_in_competition"],
+                "after_runtime": page[-1]["total_runtime"],
+                "after_user_id": page[-1]["user_id"],
+            }
+        with pytest.raises(HTTPException) as exc_info:
+            await competition_service.get_competition_results(uuid.uuid4(), uuid.uuid4(), 2, after_rank=1)
+
+    assert [row["user_id"] for page in pages for row in page] == [row["user_id"] for row in standings]
+    assert len(pages) == 3
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_database_closes_pools_that_time_out():
+    from psycopg_pool import PoolTimeout
+
+    database = import_database_module("database")
+    pools = [MagicMock(), MagicMock(), MagicMock()]
+    pools[0].wait.side_effect = PoolTimeout()
+    pools[1].wait.side_effect = PoolTimeout()
+    connection_pool = MagicMock(side_effect=pools)
+    async_pools = [MagicMock(open=AsyncMock(side_effect=PoolTimeout()), close=AsyncMock()) for _ in range(3)]
+    async_connection_pool = MagicMock(side_effect=async_pools)
+
+    with patch.object(database, "ConnectionPool", connection_pool), patch.object(
+        database, "AsyncConnectionPool", async_connection_pool
+    ):
+        db = database.Database("postgresql://", timeout=0.1)
+        async_db = database.AsyncDatabase("postgresql://", timeout=0.1)
+        with pytest.raises(SystemExit):
+            await async_db.open()
+
+    assert db.pool is pools[2]
+    pools[0].close.assert_called_once()
+    pools[1].close.assert_called_once()
+    pools[2].close.assert_not_called()
+    for pool in async_pools:
+        pool.close.assert_awaited_once()
+
+
+def test_migrations_are_applied_once():
+    import psycopg
+
+    migrations = import_database_module("migrations")
+    db = MagicMock()
+    cursor = db.pool.connection.return_value.__enter__.return_value.cursor.return_value
+    cursor.fetchall.return_value = [{"version": 1}, {"version": 2}]
+
+    with patch.object(migrations, "db", db):
+        migrations.apply_migrations()
+        pending_queries = [call.args for call in cursor.execute.call_args_list[3:]]
+        cursor.execute.reset_mock()
+        cursor.fetchall.return_value = [{"version": version} for version in range(1, len(migrations.MIGRATIONS) + 1)]
+        migrations.apply_migrations()
+        assert cursor.execute.call_count == 3
+
+        cursor.fetchall.return_value = []
+        cursor.execute.side_effect = [None, None, None, psycopg.Error("relation does not exist")]
+        with pytest.raises(psycopg.Error):
+            migrations.apply_migrations()
+
+    assert [query for (query,) in pending_queries[::2]] == migrations.MIGRATIONS[2:]
+    assert [params for _, params in pending_queries[1::2]] == [
+        (version,) for version in range(3, len(migrations.MIGRATIONS) + 1)
+    ]
+
+
+def test_competition_standings_are_updated_in_one_transaction():
+    import uuid
+
+    problem_queries = import_database_module("problem_queries")
+    db = MagicMock()
+    db.execute_many = MagicMock(return_value={"affected_rows": 3})
+    competition_id, user_id, problem_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+    with patch.object(problem_queries, "db", db):
+        assert problem_queries.update_competition_standings(competition_id, user_id)
+        (update_queries,) = db.execute_many.call_args.args
+        assert problem_queries.delete_problem(problem_id)
+        (delete_queries,) = db.execute_many.call_args.args
+
+    assert "pg_advisory_xact_lock" in update_queries[0][0]
+    assert all(params == {"competition_id": competition_id, "user_id": user_id} for _, params in update_queries)
+    assert not any("DENSE_RANK" in query for query, _ in update_queries)
+    assert "pg_advisory_xact_lock" in delete_queries[0][0]
+    assert [query.split()[0] for query, _ in delete_queries[1:]] == ["UPDATE", "DELETE", "UPDATE", "DELETE"]
+    assert delete_queries[-1][0] == "DELETE FROM problems WHERE id = %(problem_id)s"
+
+
+def test_lru_cache_eviction():
+    from bytepit_api.helpers.cache_helpers import LRUCache
+
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_get_all_tests_is_cached():
+    import uuid
+
+    from bytepit_api.helpers import blob_storage_helpers
+    from bytepit_api.storage.backends import MemoryStorage
+
+    problem_id = uuid.uuid4()
+    storage = MemoryStorage()
+    for name in ["1_out.txt", "1_in.txt", "2_in.txt", "2_out.txt"]:
+        storage.upload(f"{problem_id}/{name}", name.encode("utf-8"))
+    problem_queries = MagicMock()
+    problem_queries.get_problem_tests.return_value = []
+
+    with patch.object(blob_storage_helpers, "storage", storage), patch.object(
+        blob_storage_helpers, "problem_queries", problem_queries
+    ), patch.object(storage, "read", wraps=storage.read) as read:
+        tests = blob_storage_helpers.get_all_tests(problem_id)
+        assert blob_storage_helpers.get_all_tests(problem_id) == tests
+        assert tests["1"] == {"in": "1_in.txt", "out": "1_out.txt"}
+        assert read.call_count == 4
+
+        blob_storage_helpers.invalidate_tests(problem_id)
+        blob_storage_helpers.get_all_tests(problem_id)
+        assert read.call_count == 8
+
+
+def test_tests_pack_round_trip():
+    import uuid
+
+    from bytepit_api.helpers import blob_storage_helpers, pack_helpers
+    from bytepit_api.storage.backends import MemoryStorage
+
+    files = {"10_in.txt": b"10", "10_out.txt": b"100", "2_in.txt": b"2", "2_out.txt": b"4" * 1000}
+    data = pack_helpers.pack_files(files)
+    assert pack_helpers.unpack_files(data) == files
+
+    problem_id = uuid.uuid4()
+    storage = MemoryStorage()
+    properties = storage.upload(f"{problem_id}/tests.pack", data)
+    problem_queries = MagicMock()
+    problem_queries.get_problem_tests.return_value = []
+
+    with patch.object(blob_storage_helpers, "storage", storage), patch.object(
+        blob_storage_helpers, "problem_queries", problem_queries
+    ), patch.object(storage, "list") as list_blobs:
+        cached_tests = blob_storage_helpers.get_cached_tests(problem_id)
+
+    assert cached_tests["version"] == properties.etag
+    assert cached_tests["tests"] == {"2": {"in": "2", "out": "4" * 1000}, "10": {"in": "10", "out": "100"}}
+    list_blobs.assert_not_called()
+
+    with pytest.raises(ValueError):
+        pack_helpers.unpack_files(b"nope" + data[4:])
+
+
+def test_problem_tests_manifest_avoids_listing():
+    import uuid
+    from io import BytesIO
+
+    from bytepit_api.helpers import blob_storage_helpers
+    from bytepit_api.storage.backends import MemoryStorage
+
+    problem_id = uuid.uuid4()
+    storage = MemoryStorage()
+    problem_queries = MagicMock()
+
+    with patch.object(blob_storage_helpers, "storage", storage), patch.object(
+        blob_storage_helpers, "problem_queries", problem_queries
+    ), patch.object(storage, "list") as list_blobs:
+        files = {"1_in.txt": BytesIO(b"1"), "1_out.txt": BytesIO(b"2")}
+        problem_tests = blob_storage_helpers.upload_test_blobs(problem_id, files)
+        for file in files.values():
+            file.seek(0)
+        problem_tests.append(blob_storage_helpers.upload_tests_pack(problem_id, files))
+        problem_queries.get_problem_tests.return_value = problem_tests
+
+        assert blob_storage_helpers.get_cached_tests(problem_id)["tests"] == {"1": {"in": "1", "out": "2"}}
+        files = {"1_in.txt": BytesIO(b"1"), "1_out.txt": BytesIO(b"3")}
+        problem_tests = blob_storage_helpers.upload_test_blobs(problem_id, files)
+        for file in files.values():
+            file.seek(0)
+        problem_tests.append(blob_storage_helpers.upload_tests_pack(problem_id, files))
+        problem_queries.get_problem_tests.return_value = problem_tests
+
+        assert blob_storage_helpers.get_cached_tests(problem_id)["tests"] == {"1": {"in": "1", "out": "3"}}
+        blob_storage_helpers.delete_all_blobs(problem_id)
+
+    list_blobs.assert_not_called()
+    assert storage.list("") == []
+    problem_queries.delete_problem_tests.assert_called_once_with(problem_id)
+
+
+def test_evaluate_problem_submission_tests_keeps_order():
+    import time
+
+    from bytepit_api.helpers import submission_helpers
+
+    def run(artifact, test_input):
+        time.sleep(0.05 * (3 - int(test_input)))
+        return {"stdout": test_input, "executionTime": 1, "exception": None}
+
+    evaluator = MagicMock()
+    evaluator.compile.return_value = {"language": "cpp"}
+    evaluator.run.side_effect = run
+
+    with patch.object(submission_helpers, "evaluator", evaluator):
+        results = submission_helpers.evaluate_problem_submission_tests("code", ["1", "2", "3"], "cpp")
+
+    assert [result["stdout"] for result in results] == ["1", "2", "3"]
+    evaluator.compile.assert_called_once_with("code", "cpp")
+    evaluator.cleanup.assert_called_once_with({"language": "cpp"})
+    assert submission_helpers.artifacts == {}
+
+
+def test_local_evaluator_limits():
+    from bytepit_api.helpers.submission_helpers import LocalEvaluator
+
+    evaluator = LocalEvaluator(cpu_time_limit=1, memory_limit=128, output_limit=1000)
+
+    result = evaluator.evaluate("print(input())", "42", "python")
+    assert result["stdout"] == "42\n"
+    assert result["exception"] is None
+
+    result = evaluator.evaluate("while True: pass", "", "python")
+    assert result["stdout"] is None
+
+    result = evaluator.evaluate("print('x' * 10000)", "", "python")
+    assert result["exception"] == "Output limit exceeded"
+
+    result = evaluator.evaluate("import os; print(sorted(os.environ))", "", "python")
+    assert "SECRET_KEY" not in result["stdout"]
+
+    with patch("os.geteuid", return_value=1000):
+        with pytest.raises(ValueError):
+            LocalEvaluator()
+        assert LocalEvaluator(allow_unsafe=True).isolate is False
+    with pytest.raises(ValueError):
+        LocalEvaluator(isolate=False)
+    with pytest.raises(ValueError):
+        LocalEvaluator(uid=0)
+
+
+def test_evaluate_problem_submission_tests_fail_fast():
+    import time
+
+    from bytepit_api.helpers import submission_helpers
+
+    def run(artifact, test_input):
+        if test_input != "0":
+            time.sleep(0.05)
+        return {"stdout": test_input, "executionTime": 1, "exception": None}
+
+    evaluator = MagicMock()
+    evaluator.run.side_effect = run
+    test_inputs = [str(test_idx) for test_idx in range(20)]
+
+    with patch.object(submission_helpers, "evaluator", evaluator):
+        results = submission_helpers.evaluate_problem_submission_tests(
+            "code", test_inputs, "python", is_failed=lambda test_idx, result: test_idx == 0
+        )
+
+    assert results[0]["stdout"] == "0"
+    assert results[-1] is None
+    assert evaluator.run.call_count < len(test_inputs)
+
+    finished = []
+
+    def run_or_raise(artifact, test_input):
+        if test_input == "0":
+            raise RuntimeError("runner crashed")
+        time.sleep(0.05)
+        finished.append(test_input)
+        return {"stdout": test_input, "executionTime": 1, "exception": None}
+
+    evaluator.run.side_effect = run_or_raise
+    evaluator.cleanup.side_effect = lambda artifact: finished.append("cleanup")
+    with patch.object(submission_helpers, "evaluator", evaluator):
+        with pytest.raises(RuntimeError):
+            submission_helpers.evaluate_problem_submission_tests(
+                "other code", ["0", "1", "2"], "python", is_failed=lambda test_idx, result: False
+            )
+
+    assert finished[-1] == "cleanup"
+    assert "1" in finished
+
+
+def test_evaluate_submission_reuses_verdict():
+    import uuid
+
+    from bytepit_api.helpers import submission_helpers
+    from bytepit_api.services import problem_service
+
+    problem = MagicMock(id=uuid.uuid4(), runtime_limit=1, num_of_points=10)
+    submission = MagicMock(
+        id=uuid.uuid4(),
+        problem_id=problem.id,
+        competition_id=None,
+        user_id=uuid.uuid4(),
+        source_code="print(input())",
+        language="python",
+        judging_policy="full",
+    )
+    cached_tests = {"version": "v1", "tests": {"1": {"in": "1", "out": "1"}, "2": {"in": "2", "out": "3"}}}
+    evaluate = MagicMock(
+        return_value=[
+            {"stdout": "1", "executionTime": 1, "exception": None},
+            {"stdout": "2", "executionTime": 1, "exception": None},
+        ]
+    )
+    problem_queries = MagicMock()
+    problem_queries.insert_problem_result.return_value = True
+
+    with patch.object(problem_service, "submission_queries", MagicMock()), patch.object(
+        problem_service, "problem_queries", problem_queries
+    ), patch.object(problem_service.blob_storage_helpers, "get_cached_tests", return_value=cached_tests), patch.object(
+        submission_helpers, "evaluate_problem_submission_tests", evaluate
+    ):
+        first = problem_service.evaluate_submission(problem, submission)
+        second = problem_service.evaluate_submission(problem, submission)
+        submission_helpers.invalidate_verdicts(problem.id)
+        problem_service.evaluate_submission(problem, submission)
+
+    assert first == second
+    assert first["points"] == 5
+    assert evaluate.call_count == 2
+    assert problem_queries.insert_problem_result.call_count == 3
+
+    evaluate.return_value = [
+        {"stdout": "1", "executionTime": 1, "exception": None},
+        {"stdout": None, "executionTime": 30000, "exception": None},
+    ]
+    submission_helpers.invalidate_verdicts(problem.id)
+    with patch.object(problem_service, "submission_queries", MagicMock()), patch.object(
+        problem_service, "problem_queries", problem_queries
+    ), patch.object(problem_service.blob_storage_helpers, "get_cached_tests", return_value=cached_tests), patch.object(
+        submission_helpers, "evaluate_problem_submission_tests", evaluate
+    ):
+        problem_service.evaluate_submission(problem, submission)
+        problem_service.evaluate_submission(problem, submission)
+
+    assert evaluate.call_count == 4
+
+
+def test_upload_readers_enforce_max_size():
+    import hashlib
+    from io import BytesIO
+
+    from bytepit_api.helpers import upload_helpers
+
+    reader = upload_helpers.HashingReader(BytesIO(b"abcdef"), max_size=6)
+    assert reader.read(4) + reader.read(4) == b"abcdef"
+    assert reader.size == 6
+    assert reader.hexdigest() == hashlib.sha256(b"abcdef").hexdigest()
+
+    with pytest.raises(HTTPException) as exc_info:
+        upload_helpers.HashingReader(BytesIO(b"abcdef"), max_size=5).read()
+    assert exc_info.value.status_code == 413
+
+    upload = MagicMock()
+    upload.file = BytesIO(b"x" * 10)
     with pytest.raises(HTTPException):
-        create_competition(competition_dto_mock, competition_dto_mock.organiser_id)
+        upload_helpers.read_upload(upload, max_size=9)
+
+
+def test_bulk_blob_operations_report_failures():
+    import uuid
+    from io import BytesIO
+
+    from bytepit_api.helpers import blob_storage_helpers
+    from bytepit_api.storage.backends import AzureStorage, MemoryStorage
+
+    azure_storage = AzureStorage.__new__(AzureStorage)
+    azure_storage.container = "tests"
+    azure_storage.client = MagicMock()
+    container_client = azure_storage.client.get_container_client.return_value
+    container_client.delete_blobs.side_effect = lambda *names, **kwargs: [
+        MagicMock(status_code=403 if name.endswith("3") else 202, reason="Forbidden") for name in names
+    ]
+    failed_files = azure_storage.delete_many([f"blob-{i}" for i in range(300)])
+    assert failed_files == {f"blob-{i}": "Forbidden" for i in range(300) if i % 10 == 3}
+    assert container_client.delete_blobs.call_count == 2
+
+    problem_id = uuid.uuid4()
+    storage = MemoryStorage()
+    upload = storage.upload
+
+    def upload_blob(name, data):
+        if name.endswith("out.txt"):
+            raise Exception("boom")
+        return upload(name, data)
+
+    with patch.object(blob_storage_helpers, "storage", storage), patch.object(storage, "upload", upload_blob):
+        with pytest.raises(HTTPException) as exc_info:
+            blob_storage_helpers.upload_test_blobs(
+                problem_id, {"1_in.txt": BytesIO(b"1"), "1_out.txt": BytesIO(b"2")}
+            )
+
+    assert exc_info.value.status_code == 500
+    assert list(exc_info.value.detail["failed_files"]) == ["1_out.txt"]
+    assert storage.list("") == []
+
+
+@pytest.mark.asyncio
+async def test_get_blob_async_streams_chunks():
+    from bytepit_api.helpers import blob_storage_helpers
+    from bytepit_api.storage.backends import MemoryStorage
+
+    storage = MemoryStorage()
+    properties = storage.upload("problem/1_in.txt", b"abcd")
+
+    with patch.object(blob_storage_helpers, "storage", storage):
+        response = await blob_storage_helpers.get_blob_async("problem/1_in.txt")
+        assert b"".join([chunk async for chunk in response.body_iterator]) == b"abcd"
+        assert response.headers["etag"] == properties.etag
+        assert response.headers["content-length"] == "4"
+        assert response.headers["content-type"] == "text/plain; charset=utf-8"
+        assert "last-modified" in response.headers
+
+        response = await blob_storage_helpers.get_blob_async(
+            "problem/1_in.txt", {"if-none-match": f"W/{properties.etag}"}
+        )
+        assert response.status_code == 304
+
+        response = await blob_storage_helpers.get_blob_async("problem/1_in.txt", {"range": "bytes=1-"})
+        assert response.status_code == 206
+        assert response.headers["content-range"] == "bytes 1-3/4"
+        assert b"".join([chunk async for chunk in response.body_iterator]) == b"bcd"
+
+        response = await blob_storage_helpers.get_blob_async("problem/1_in.txt", {"range": "bytes=10-"})
+        assert response.status_code == 416
+
+        with pytest.raises(HTTPException) as exc_info:
+            await blob_storage_helpers.get_blob_async("problem/2_in.txt")
+        assert exc_info.value.status_code == 404
+
+
+def test_parse_range_header():
+    from bytepit_api.helpers import http_helpers
+
+    assert http_helpers.parse_range_header(None, 100) is None
+    assert http_helpers.parse_range_header("bytes=0-9", 100) == (0, 9)
+    assert http_helpers.parse_range_header("bytes=90-200", 100) == (90, 99)
+    assert http_helpers.parse_range_header("bytes=-10", 100) == (90, 99)
+    assert http_helpers.parse_range_header("bytes=-500", 100) == (0, 99)
+    assert http_helpers.parse_range_header("bytes=5-1", 100) is None
+    assert http_helpers.parse_range_header("bytes=0-1,5-6", 100) is None
+    assert http_helpers.parse_range_header("items=0-1", 100) is None
+    with pytest.raises(http_helpers.RangeNotSatisfiable):
+        http_helpers.parse_range_header("bytes=100-", 100)
+    with pytest.raises(http_helpers.RangeNotSatisfiable):
+        http_helpers.parse_range_header("bytes=-0", 100)
+
+
+@pytest.mark.asyncio
+async def test_local_storage_backend(tmp_path):
+    import tempfile
+
+    from bytepit_api.storage.backends import BlobModifiedError, BlobNotFoundError, LocalStorage, StorageBackend
+
+    with pytest.raises(TypeError):
+        StorageBackend()
+    storage = LocalStorage(str(tmp_path))
+    properties = storage.upload("problem/1_in.txt", b"0123456789")
+    with tempfile.TemporaryFile() as source:
+        source.write(b"spooled")
+        source.seek(0)
+        storage.upload("problem/1_out.txt", source)
+
+    assert storage.read("problem/1_out.txt") == b"spooled"
+    assert storage.get_properties("problem/1_in.txt") == properties
+    assert b"".join(storage.iter_chunks("problem/1_in.txt", offset=2, length=3)) == b"234"
+    chunks = await storage.open_stream("problem/1_in.txt", etag=properties.etag)
+    assert b"".join([chunk async for chunk in chunks]) == b"0123456789"
+    assert [blob.name for blob in storage.list("problem/")] == ["problem/1_in.txt", "problem/1_out.txt"]
+
+    with pytest.raises(BlobModifiedError):
+        storage.iter_chunks("problem/1_in.txt", etag='"stale"')
+    with pytest.raises(BlobNotFoundError):
+        storage.get_properties("../outside.txt")
+
+    assert storage.delete_many(["problem/1_in.txt", "problem/1_out.txt", "problem/missing.txt"]) == {}
+    assert storage.list("") == []
+
+
+def test_get_current_user_caches_principal():
+    from bytepit_api.dependencies import auth_dependencies
+    from bytepit_api.helpers import auth_helpers
+    from bytepit_api.services import admin_service
+
+    user = make_user(username="cached", email="cached@example.com")
+    auth_queries = MagicMock()
+    auth_queries.get_user_by_email = MagicMock(return_value=user)
+    admin_queries = MagicMock()
+    admin_queries.set_user_role = MagicMock(return_value=True)
+    token = auth_helpers.create_access_token(data={"sub": user.email})
+
+    auth_helpers.principal_cache.clear()
+    with patch.object(auth_helpers, "auth_queries", auth_queries), patch.object(
+        admin_service, "admin_queries", admin_queries
+    ):
+        assert auth_dependencies.get_current_user(token) == user
+        assert auth_dependencies.get_current_user(token) == user
+        auth_queries.get_user_by_email.assert_called_once_with(user.email)
+
+        admin_service.set_user_role(user.username, "organiser")
+        auth_dependencies.get_current_user(token)
+
+    assert auth_queries.get_user_by_email.call_count == 2
+
+
+def test_token_claims_skip_user_lookup():
+    from bytepit_api.dependencies import auth_dependencies
+    from bytepit_api.helpers import auth_helpers
+    from bytepit_api.services import admin_service
+
+    user = make_user(username="claims", email="claims@example.com", role="admin", token_epoch=3)
+    auth_queries = MagicMock()
+    auth_queries.get_token_epoch = MagicMock(return_value={"username": user.username, "token_epoch": 3})
+    admin_queries = MagicMock()
+    admin_queries.set_user_role = MagicMock(return_value=True)
+
+    auth_helpers.token_epoch_cache.clear()
+    with patch.object(auth_helpers, "TOKEN_CLAIMS_ENABLED", True), patch.object(
+        auth_helpers, "auth_queries", auth_queries
+    ), patch.object(admin_service, "admin_queries", admin_queries):
+        token = auth_helpers.create_access_token(data=auth_helpers.get_token_claims(user))
+        principal = auth_dependencies.get_current_user(token)
+        auth_dependencies.get_current_admin_user(auth_dependencies.get_current_verified_user(principal))
+        auth_dependencies.get_current_user(token)
+
+        assert principal.id == user.id
+        auth_queries.get_user_by_email.assert_not_called()
+        auth_queries.get_token_epoch.assert_called_once_with(user.id)
+
+        admin_service.set_user_role(user.username, "contestant")
+        auth_queries.get_token_epoch.return_value = {"username": user.username, "token_epoch": 4}
+        with pytest.raises(HTTPException) as exc_info:
+            auth_dependencies.get_current_user(token)
+
+    assert exc_info.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_password():
+    from passlib.context import CryptContext
+
+    from bytepit_api.helpers import auth_helpers
+
+    old_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    new_context = CryptContext(
+        schemes=["bcrypt"], bcrypt__default_rounds=5, bcrypt__min_rounds=5, bcrypt__max_rounds=5
+    )
+    user = make_user(password_hash=old_context.hash("secret"), username="rehash", email="rehash@example.com")
+    auth_queries = MagicMock()
+    auth_queries.get_user_by_username = MagicMock(return_value=user)
+    auth_queries.update_password_hash = MagicMock(return_value=True)
+    completed = auth_helpers.get_password_hashing_stats()["completed"]
+
+    with patch.object(auth_helpers, "auth_queries", auth_queries), patch.object(
+        auth_helpers, "pwd_context", new_context
+    ):
+        assert await auth_helpers.authenticate_user("rehash", "wrong") is False
+        auth_queries.update_password_hash.assert_not_called()
+        assert await auth_helpers.authenticate_user("rehash", "secret") == user
+
+    auth_queries.update_password_hash.assert_called_once_with(user.id, user.password_hash)
+    assert user.password_hash.startswith("$2b$05$")
+    stats = auth_helpers.get_password_hashing_stats()
+    assert stats["completed"] == completed + 2
+    assert stats["queued"] == stats["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_verification_email_is_queued_and_retried():
+    import importlib
+    import uuid
+
+    from datetime import datetime
+
+    import bytepit_api.helpers
+
+    from bytepit_api.models.db_models import OutboundEmail
+
+    with patch.dict(sys.modules), patch.object(bytepit_api.helpers, "email_helpers", create=True), patch.dict(
+        os.environ, {"COMMUNICATION_SERVICES_CONNECTION_STRING": "endpoint=https://x/;accesskey=eA=="}
+    ):
+        del sys.modules["bytepit_api.helpers.email_helpers"]
+        email_helpers = importlib.import_module("bytepit_api.helpers.email_helpers")
+
+    email_queries = MagicMock()
+    outbound_email = OutboundEmail(
+        id=uuid.uuid4(),
+        recipient="queued@example.com",
+        subject=email_helpers.VERIFICATION_EMAIL_SUBJECT,
+        html="<html></html>",
+        plaintext="confirm",
+        status="sending",
+        attempts=3,
+        next_attempt_at=datetime.now(),
+        created_on=datetime.now(),
+        updated_on=datetime.now(),
+    )
+    email_queries.claim_due_emails = MagicMock(return_value=[outbound_email])
+    client = MagicMock()
+    client.begin_send = MagicMock(side_effect=RuntimeError("provider down"))
+
+    with patch.object(email_helpers, "email_queries", email_queries), patch.object(email_helpers, "client", client):
+        verification_email = email_helpers.render_verification_email("queued@example.com", "token123")
+        email_helpers.wake_email_sender()
+        assert email_helpers.send_pending_emails() == 1
+
+    assert verification_email["recipient"] == "queued@example.com"
+    assert verification_email["subject"] == email_helpers.VERIFICATION_EMAIL_SUBJECT
+    assert "/confirm-email/token123" in verification_email["html"]
+    assert "/confirm-email/token123" in verification_email["plaintext"]
+    assert email_helpers.email_wakeup.is_set()
+    email_queries.set_email_failed.assert_called_once_with(
+        outbound_email.id, "provider down", email_helpers.EMAIL_RETRY_BASE_DELAY * 4, email_helpers.EMAIL_MAX_ATTEMPTS
+    )
+    email_queries.set_email_sent.assert_not_called()
+
+    timed_out = MagicMock()
+    timed_out.done.return_value = False
+    timed_out.result.return_value = None
+    succeeded = MagicMock()
+    succeeded.done.return_value = True
+    succeeded.result.return_value = {"status": "Succeeded"}
+    client.begin_send = MagicMock(side_effect=[timed_out, succeeded])
+    email_queries.reset_mock()
+    with patch.object(email_helpers, "email_queries", email_queries), patch.object(email_helpers, "client", client):
+        email_helpers.send_pending_emails()
+        email_queries.set_email_sent.assert_not_called()
+        email_queries.set_email_failed.assert_called_once()
+        email_helpers.send_pending_emails()
+
+    email_queries.set_email_sent.assert_called_once_with(outbound_email.id)
+
+
+@pytest.mark.asyncio
+async def test_media_is_served_by_content_hash():
+    import uuid
+
+    from bytepit_api.helpers import media_helpers
+    from bytepit_api.models.db_models import Media
+    from bytepit_api.models.dtos import TrophyDTO
+
+    content = b"\x89PNG\r\n\x1a\n" + b"icon"
+    sha = media_helpers.get_media_sha(content)
+    media_queries = MagicMock()
+    media_queries.get_media = AsyncMock(return_value=Media(sha=sha, content=content))
+
+    media_helpers.media_cache.clear()
+    with patch.object(media_helpers, "media_queries", media_queries):
+        response = await media_helpers.get_media(sha, {})
+        await media_helpers.get_media(sha, {})
+        not_modified = await media_helpers.get_media(sha, {"if-none-match": f'"{sha}"'})
+        with pytest.raises(HTTPException) as exc_info:
+            await media_helpers.get_media("../users", {})
+
+    assert response.body == content
+    assert response.media_type == "image/png"
+    assert "immutable" in response.headers["cache-control"]
+    assert not_modified.status_code == 304
+    assert exc_info.value.status_code == 404
+    media_queries.get_media.assert_awaited_once_with(sha)
+    trophy = TrophyDTO(id=uuid.uuid4(), position=1, icon_sha=sha).model_dump()
+    assert trophy["icon_url"] == f"/api/media/{sha}"
+
+
+@pytest.mark.asyncio
+async def test_submission_is_judged_by_worker():
+    import uuid
+
+    from datetime import datetime
+
+    from bytepit_api.helpers import judge_helpers
+    from bytepit_api.models.db_models import Submission
+    from bytepit_api.models.dtos import CreateSubmissionDTO
+    from bytepit_api.services import problem_service
+
+    user_id = uuid.uuid4()
+    problems = [MagicMock(id=uuid.uuid4()), MagicMock(id=uuid.uuid4())]
+    submissions = {}
+
+    def insert_submission(user_id, submission, judging_policy):
+        queued = Submission(
+            id=uuid.uuid4(),
+            user_id=user_id,
+            problem_id=submission.problem_id,
+            source_code=submission.source_code,
+            language=submission.language,
+            judging_policy=judging_policy,
+            status="queued",
+            tests_total=0,
+            tests_done=0,
+            created_on=datetime.now(),
+        )
+        submissions[queued.id] = queued
+        return queued
+
+    def claim_submission(submission_id):
+        submissions[submission_id] = Submission(**{**submissions[submission_id].model_dump(), "status": "running"})
+        return submissions[submission_id]
+
+    def finish_submission(submission_id, result):
+        submissions[submission_id] = Submission(
+            **{**submissions[submission_id].model_dump(), "status": "done", "result": result}
+        )
+        return True
+
+    def evaluate_submission(problem, submission):
+        if problem is problems[1]:
+            raise RuntimeError("blob storage unavailable")
+        return {**problem_service.get_failed_submission_result(None), "is_correct": True, "points": 10}
+
+    submission_queries = MagicMock(
+        insert_submission=insert_submission,
+        claim_submission=claim_submission,
+        finish_submission=finish_submission,
+        get_submission=lambda submission_id: submissions.get(submission_id),
+    )
+    with patch.object(problem_service, "submission_queries", submission_queries), patch.object(
+        problem_service.problem_helpers, "get_problem", lambda problem_id: next(p for p in problems if p.id == problem_id)
+    ), patch.object(problem_service, "evaluate_submission", evaluate_submission):
+        judge_helpers.start_judge_workers(problem_service.judge_submission, 1)
+        try:
+            queued = [
+                await problem_service.create_submission(
+                    user_id, CreateSubmissionDTO(problem_id=problem.id, source_code="code", language="python")
+                )
+                for problem in problems
+            ]
+            judge_helpers.submission_queue.join()
+        finally:
+            judge_helpers.stop_judge_workers()
+        judged = problem_service.get_submission_status(queued[0].id, user_id)
+        failed = problem_service.get_submission_status(queued[1].id, user_id)
+        with pytest.raises(HTTPException) as exc_info:
+            problem_service.get_submission_status(queued[0].id, uuid.uuid4())
+
+    assert [submission.status for submission in queued] == ["queued", "queued"]
+    assert judged.status == "done" and judged.result.points == 10
+    assert failed.status == "done" and failed.result.exception == "Internal error while judging: RuntimeError"
+    assert exc_info.value.status_code == 404